@@ -1,10 +1,19 @@
-from flask import Flask, Response, render_template, jsonify, send_file
+import time
+STARTUP_TIME = time.perf_counter()  # Reference for the startup timings
+
+from flask import Flask, Response, render_template, jsonify, send_file, request
 from flask_socketio import SocketIO
 from camera_manager import CameraManager
-import time
-import threading
+from calibration_monitor import CalibrationMonitor
+from marker_tracker import MarkerTracker
+from marker_stream import MarkerStreamer
+from stream_hub import StreamHub
+from pose_history import PoseHistory
 import json
 import io
+import math
+import threading
+import urllib.request
 
 app = Flask(__name__, static_folder='static', static_url_path='/static')
 socketio = SocketIO(app)
@@ -12,14 +21,136 @@ socketio = SocketIO(app)
 print("1. Starting script")
 
 camera_manager = CameraManager()
-camera_manager.initialize_cameras()
 
-def send_camera_updates():
-    while True:
-        camera_data = camera_manager.get_camera_data()
-        camera_data['isCalibration'] = False  # Regular update
-        socketio.emit('camera_positions_update', camera_data)
-        socketio.sleep(0.1)
+def send_calibration_alert(alert):
+    socketio.emit('calibration_drift_alert', alert)
+
+calibration_monitor = CalibrationMonitor(camera_manager, on_alert=send_calibration_alert)
+
+marker_tracker = MarkerTracker()
+# Recent marker and body states for latency-compensated lookups
+pose_history = PoseHistory()
+marker_streamer = MarkerStreamer(lambda payload, sid: socketio.emit('marker_frame', payload, to=sid))
+
+# Video streams and data feeds are served from one event loop
+stream_hub = StreamHub(camera_manager, max_viewers=32)
+
+def produce_camera_update():
+    camera_data = camera_manager.get_camera_data()
+    camera_data['isCalibration'] = False  # Regular update
+    return camera_data
+
+def send_camera_update(camera_data):
+    socketio.emit('camera_positions_update', camera_data)
+
+last_marker_timestamp = None
+tracking_version = None  # Calibration version the tracks and pose history are in
+tracking_lock = threading.Lock()
+
+def reset_tracking():
+    """Drop tracks and pose history; they are in the frame of the old calibration"""
+    global tracking_version
+    with tracking_lock:
+        marker_tracker.reset()
+        pose_history.clear()
+        tracking_version = camera_manager.calibration_store.version
+
+def produce_marker_update():
+    global last_marker_timestamp
+    if not camera_manager.detect_dots:
+        return None
+    # Calibrations and refinements saved elsewhere also move the world frame
+    if camera_manager.calibration_store.version != tracking_version:
+        reset_tracking()
+    points, timestamp, cameras = camera_manager.reconstruct_markers()
+    # Only publish when new detections have arrived
+    if points is None or timestamp == last_marker_timestamp:
+        return None
+    last_marker_timestamp = timestamp
+    with tracking_lock:
+        marker_tracker.update(points, timestamp)
+        ids, positions, trails, counts = marker_tracker.get_tracks()
+        bodies = marker_tracker.get_bodies()
+        # History is keyed on when the scene was imaged, not when frames were stamped
+        pose_history.record(camera_manager.latency.scene_time(timestamp, cameras), ids, positions, bodies)
+    return points, timestamp, (ids, trails, counts), bodies
+
+def send_marker_update(update):
+    points, timestamp, tracks, bodies = update
+    marker_streamer.publish(points, timestamp, tracks, bodies)
+
+def send_startup_progress(status):
+    socketio.emit('startup_progress', status)
+
+PORT = 3001
+
+def measure_first_response(port, timeout=30.0):
+    """
+    Time until the server can answer, measured by requesting /startup_status
+    on localhost from the moment the app starts, then report the startup
+    timings together once camera discovery has finished.
+    """
+    url = f'http://127.0.0.1:{port}/startup_status'
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1.0) as response:
+                response.read()
+            camera_manager.mark_startup_time('time_to_first_response')
+            break
+        except OSError:
+            time.sleep(0.01)
+    
+    while not camera_manager.ready and time.perf_counter() < deadline:
+        time.sleep(0.05)
+    times = camera_manager.get_startup_status()['times']
+    print("[startup] " + ", ".join(f"{name.replace('_', ' ')}: {seconds:.3f}s" for name, seconds in times.items()))
+
+MAX_PREDICTION_HORIZON = 0.5  # Seconds a state may be extrapolated past the newest sample
+
+def parse_state_request(timestamp, horizon):
+    """
+    Validate a state request.
+
+    Returns:
+        (timestamp, horizon, error) with timestamp None for now, the horizon
+        clamped to [0, MAX_PREDICTION_HORIZON], and error a message if the
+        values are not numbers
+    """
+    try:
+        timestamp = None if timestamp is None else float(timestamp)
+        horizon = float(horizon)
+    except (TypeError, ValueError):
+        return None, None, "t and horizon must be numbers"
+    if (timestamp is not None and not math.isfinite(timestamp)) or math.isnan(horizon):
+        return None, None, "t and horizon must be finite numbers"
+    return timestamp, min(max(horizon, 0.0), MAX_PREDICTION_HORIZON), None
+
+def get_state(timestamp=None, max_extrapolation=0.1):
+    """Marker and body states at a requested time, defaulting to now"""
+    now = time.time()
+    requested = now if timestamp is None else timestamp
+    state = pose_history.query(requested, max_extrapolation)
+    state.update({
+        'requested_time': requested,
+        'server_time': now,
+        'latest_sample_time': pose_history.latest_time,
+        'latency': camera_manager.latency.summary()
+    })
+    return state
+
+@app.route('/state')
+def state():
+    """Return interpolated or predicted marker and body states at ?t=<unix time>"""
+    timestamp, horizon, error = parse_state_request(request.args.get('t'), request.args.get('horizon', 0.1))
+    if error:
+        return jsonify({'error': error}), 400
+    return jsonify(get_state(timestamp, horizon))
+
+@app.route('/startup_status')
+def startup_status():
+    """Return camera discovery progress and startup timings"""
+    return jsonify(camera_manager.get_startup_status())
 
 @app.route('/')
 def index():
@@ -34,11 +165,25 @@ def get_config():
     config_data = {
         'camera_positions': camera_manager.camera_positions,
         'calibration_data': getattr(camera_manager, 'calibration_data', {}),
+        'calibration_version': camera_manager.calibration_store.version,
         'using_mock': camera_manager.using_mock  # Add mock status to config
     }
     print("Sending config data:", config_data)  # Debug print
     return jsonify(config_data)
 
+@app.route('/calibration_health')
+def calibration_health():
+    """Return rolling calibration error statistics"""
+    return jsonify(calibration_monitor.get_health())
+
+@app.route('/calibration_versions')
+def calibration_versions():
+    """Return the calibration versions that can be restored"""
+    return jsonify({
+        'current': camera_manager.calibration_store.version,
+        'versions': camera_manager.calibration_store.versions()
+    })
+
 @app.route('/placeholder_frame/<int:camera_id>')
 def placeholder_frame(camera_id):
     frame_bytes = camera_manager.get_placeholder_frame(camera_id)
@@ -49,11 +194,14 @@ def placeholder_frame(camera_id):
 
 @app.route('/video_feed/<int:camera_id>')
 def video_feed(camera_id):
-    if camera_id < camera_manager.num_cameras:
-        return Response(camera_manager.gen_frames(camera_id),
-                        mimetype='multipart/x-mixed-replace; boundary=frame')
-    else:
+    if camera_id >= camera_manager.num_cameras:
         return "Camera not available", 404
+    
+    viewer = stream_hub.open_viewer(camera_id)
+    if viewer is None:
+        return "Too many viewers", 503
+    return Response(stream_hub.iter_frames(camera_id, viewer),
+                    mimetype='multipart/x-mixed-replace; boundary=frame')
 
 @socketio.on('update_camera_settings')
 def update_camera_settings(data):
@@ -82,6 +230,10 @@ def handle_calibration():
     success, message, new_positions = camera_manager.calibrate_cameras()
     
     if success and new_positions:
+        # Start drift statistics and tracking from scratch for the new calibration
+        calibration_monitor.reset()
+        reset_tracking()
+
         # Send camera positions update with calibration flag
         camera_data = camera_manager.get_camera_data()
         camera_data['isCalibration'] = True  # Add flag to indicate this is a calibration update
@@ -101,25 +253,87 @@ def handle_calibration():
             'silent': False
         })
 
+@socketio.on('rollback_calibration')
+def handle_rollback(data):
+    try:
+        version = int(data['version'])
+    except (KeyError, TypeError, ValueError):
+        socketio.emit('calibration_response', {
+            'success': False,
+            'message': 'Rollback needs a calibration version number',
+            'silent': False
+        })
+        return
+
+    success, message = camera_manager.rollback_calibration(version)
+    if success:
+        reset_tracking()
+        # Send the restored camera positions like a fresh calibration
+        camera_data = camera_manager.get_camera_data()
+        camera_data['isCalibration'] = True
+        socketio.emit('camera_positions_update', camera_data)
+    socketio.emit('calibration_response', {
+        'success': success,
+        'message': message,
+        'silent': False
+    })
+
+@socketio.on('subscribe_markers')
+def subscribe_markers(data):
+    settings = marker_streamer.subscribe(request.sid,
+                                         rate=data.get('rate', 30),
+                                         max_points=data.get('max_points', 512),
+                                         trails=data.get('trails', True))
+    socketio.emit('marker_subscription', settings, to=request.sid)
+
+@socketio.on('request_state')
+def request_state(data):
+    data = data or {}
+    timestamp, horizon, error = parse_state_request(data.get('timestamp'), data.get('horizon', 0.1))
+    if error:
+        socketio.emit('state_response', {'error': error}, to=request.sid)
+        return
+    socketio.emit('state_response', get_state(timestamp, horizon), to=request.sid)
+
+@socketio.on('clock_sync')
+def clock_sync(data):
+    # Lets clients on their own clocks estimate their offset to server time
+    socketio.emit('clock_sync_response', {
+        'client_time': (data or {}).get('client_time'),
+        'server_time': time.time()
+    }, to=request.sid)
+
 @socketio.on('connect')
 def handle_connect():
     print("Client connected")
 
+@socketio.on('disconnect')
+def handle_disconnect():
+    marker_streamer.unsubscribe(request.sid)
+
 if __name__ == '__main__':
     try:
         print("4. Starting Flask app")
-        print(f"Using {'mock' if camera_manager.using_mock else 'real'} cameras")
         
-        # Start the camera update thread
-        camera_update_thread = threading.Thread(target=send_camera_updates)
-        camera_update_thread.daemon = True
-        camera_update_thread.start()
+        # Find cameras in the background so the server comes up right away
+        camera_manager.start_discovery(on_progress=send_startup_progress, started_at=STARTUP_TIME)
+        
+        # Start the event loop serving streams and data feeds
+        stream_hub.start()
+        stream_hub.add_feed(produce_camera_update, send_camera_update, interval=0.1)
+        stream_hub.add_feed(produce_marker_update, send_marker_update, interval=1 / 60)
+        
+        # Watch calibration health in the background
+        calibration_monitor.start()
         
-        socketio.run(app, debug=False, port=3001)
+        threading.Thread(target=measure_first_response, args=(PORT,), daemon=True).start()
+        socketio.run(app, debug=False, port=PORT)
         print("5. Flask app has finished running")
     except Exception as e:
         print(f"Error running application: {str(e)}")
     finally:
-        camera_manager.close_cameras()
+        calibration_monitor.stop()
+        # Stops producers, releases viewers and closes the cameras
+        stream_hub.shutdown()
 
 print("7. Script execution completed")
\ No newline at end of file
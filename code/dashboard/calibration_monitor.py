@@ -0,0 +1,452 @@
+import os
+import threading
+import time
+import traceback
+
+import numpy as np
+
+from geometry import to_homogeneous, fundamental_from_extrinsics, match_epipolar, sampson_errors
+
+
+# Camera pairs covered by the chained calibration, with the attribute names
+# CameraManager stores their extrinsics under
+CALIBRATED_PAIRS = [
+    (0, 1, 'R12', 't12'),
+    (1, 2, 'R23', 't23'),
+]
+
+
+class CalibrationMonitor:
+    """
+    Watches calibration health while the system is tracking.
+
+    The monitor samples the dots CameraManager already detects for the live
+    streams, matches them across each calibrated pair with the epipolar
+    constraint and keeps rolling per-pair error statistics. The first samples
+    after each calibration version form a reference error for every pair,
+    which is saved with the version so a restart does not re-learn it from a
+    rig that may have been bumped meanwhile. A pair is degraded when its
+    rolling median rises more than the threshold above that reference. A camera is reported as drifting when the pairs it
+    belongs to have degraded, and an alert is raised through on_alert.
+    Optionally a degraded pair is re-estimated on a low-priority thread and
+    saved if the new extrinsics reduce the error.
+    """
+
+    def __init__(self, camera_manager, on_alert=None, threshold_px=2.0, window=120,
+                 min_samples=20, reference_samples=20, sample_interval=0.5, max_skew=0.05,
+                 match_gate_px=15.0, refine=False, min_improvement=0.2, min_correspondences=8,
+                 distinct_px=2.0, min_spread_px=10.0, retry_correspondences=16, max_cpu_fraction=0.02):
+        """
+        Args:
+            camera_manager: CameraManager providing detections and extrinsics
+            on_alert: Callback receiving an alert dict when drift is detected
+            threshold_px: Rise of the rolling median error (pixels) over the
+                reference error above which a pair is degraded
+            window: Number of samples kept per pair for the rolling statistics
+            min_samples: Samples after the reference required before a pair can degrade
+            reference_samples: Samples after a calibration change forming the
+                reference error, when none was saved for the version
+            sample_interval: Seconds between samples; the CPU budget may lengthen it
+            max_skew: Maximum timestamp difference (s) between detections of a pair
+            match_gate_px: Matches with a larger error are treated as mismatches
+            refine: Whether to attempt an incremental extrinsic refinement on drift
+            min_improvement: Relative error reduction required to accept a refinement
+            min_correspondences: Distinct correspondences needed in each of the
+                fit and held-out sets of a refinement
+            distinct_px: Correspondences closer than this in both images are
+                treated as the same observation
+            min_spread_px: Smallest spread (pixels, standard deviation along the
+                narrowest direction) of a refinement set in each image
+            retry_correspondences: New distinct correspondences a pair needs
+                before a refinement is attempted again
+            max_cpu_fraction: CPU budget; the sample interval backs off above it
+        """
+        self.camera_manager = camera_manager
+        self.on_alert = on_alert
+        self.threshold_px = threshold_px
+        self.window = window
+        self.min_samples = min_samples
+        self.reference_samples = reference_samples
+        self.base_interval = sample_interval
+        self.sample_interval = sample_interval
+        self.max_skew = max_skew
+        self.match_gate_px = match_gate_px
+        self.refine = refine
+        self.min_improvement = min_improvement
+        self.min_correspondences = min_correspondences
+        self.distinct_px = distinct_px
+        self.min_spread_px = min_spread_px
+        self.retry_correspondences = retry_correspondences
+        self.max_cpu_fraction = max_cpu_fraction
+
+        self._lock = threading.Lock()
+        self._refine_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+        # Matched pixel correspondences per pair, kept for refinement
+        self._corr_capacity = 256
+        self._corr = {pair[:2]: np.zeros((self._corr_capacity, 2, 2)) for pair in CALIBRATED_PAIRS}
+        self._corr_count = {pair[:2]: 0 for pair in CALIBRATED_PAIRS}
+
+        self._cpu_fraction = 0.0
+        self._version = None
+        self.reset()
+
+    def reset(self):
+        """Clear all statistics, e.g. after a fresh calibration."""
+        num_pairs = len(CALIBRATED_PAIRS)
+        with self._lock:
+            self._errors = np.full((num_pairs, self.window), np.nan)
+            self._next = np.zeros(num_pairs, dtype=np.intp)
+            self._reference_errors = np.full((num_pairs, self.reference_samples), np.nan)
+            self._reference_count = np.zeros(num_pairs, dtype=np.intp)
+            self._reference = np.full(num_pairs, np.nan)
+            self._alerting = np.zeros(self.camera_manager.num_cameras, dtype=bool)
+            self._last_timestamps = [None] * num_pairs
+            # Correspondence keys each pair's last refinement attempt saw
+            self._refine_attempts = {}
+            for key in self._corr_count:
+                self._corr_count[key] = 0
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._cpu_fraction = 0.0
+        self.sample_interval = self.base_interval
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            cycle_started = time.perf_counter()
+            started = time.thread_time()
+            try:
+                self.sample()
+            except Exception as e:
+                print(f"Calibration monitor sample failed: {str(e)}")
+            busy = time.thread_time() - started
+            self._stop_event.wait(self.sample_interval)
+
+            # Recent CPU use, so a brief spike does not slow sampling for good
+            cycle = time.perf_counter() - cycle_started
+            if cycle > 0:
+                self._cpu_fraction += 0.2 * (busy / cycle - self._cpu_fraction)
+            if self._cpu_fraction > self.max_cpu_fraction:
+                self.sample_interval = min(self.sample_interval * 2, 5.0)
+            elif self._cpu_fraction < self.max_cpu_fraction / 2:
+                self.sample_interval = max(self.sample_interval / 2, self.base_interval)
+
+    def sample(self):
+        """Take one sample of the current detections and update the statistics."""
+        cm = self.camera_manager
+        latest = list(cm.latest_dots)
+        if not cm.streaming or not cm.detect_dots:
+            return
+
+        calibration = cm.calibration_store.snapshot
+        if not calibration.is_calibrated:
+            return
+        # Statistics only describe one calibration version
+        if calibration.version != self._version:
+            self.reset()
+            self._version = calibration.version
+            self._restore_reference(calibration.version)
+
+        pair_errors = {}
+        for index, (cam_a, cam_b, _, _) in enumerate(CALIBRATED_PAIRS):
+            if cam_b >= calibration.num_cameras or latest[cam_a] is None or latest[cam_b] is None:
+                continue
+            (dots_a, ts_a), (dots_b, ts_b) = latest[cam_a], latest[cam_b]
+            # Skip stale or unsynchronised detections
+            if ts_a is None or ts_b is None or abs(ts_a - ts_b) > self.max_skew:
+                continue
+            if self._last_timestamps[index] == (ts_a, ts_b):
+                continue
+
+            pts_a = to_homogeneous(dots_a)
+            pts_b = to_homogeneous(dots_b)
+            idx_a, idx_b, errors = match_epipolar(calibration.fundamental(cam_a, cam_b),
+                                                  pts_a, pts_b, self.match_gate_px)
+            if len(errors) == 0:
+                continue
+
+            self._last_timestamps[index] = (ts_a, ts_b)
+            pair_errors[index] = float(np.median(errors))
+            self._store_correspondences((cam_a, cam_b),
+                                        np.asarray(dots_a, dtype=np.float64)[idx_a],
+                                        np.asarray(dots_b, dtype=np.float64)[idx_b])
+
+        if pair_errors:
+            self.record_errors(pair_errors)
+
+    def record_errors(self, pair_errors):
+        """
+        Add one sample of median pair errors and check for drift.
+
+        Args:
+            pair_errors: Dict of index into CALIBRATED_PAIRS -> median error in pixels
+        """
+        learned = {}
+        with self._lock:
+            for index, error in pair_errors.items():
+                count = self._reference_count[index]
+                if count < self.reference_samples:
+                    # Still learning what a healthy error looks like for this version
+                    self._reference_errors[index, count] = error
+                    self._reference_count[index] += 1
+                    if count + 1 == self.reference_samples:
+                        self._reference[index] = np.median(self._reference_errors[index])
+                        learned[self._pair_key(index)] = float(self._reference[index])
+                else:
+                    self._errors[index, self._next[index] % self.window] = error
+                    self._next[index] += 1
+
+        if learned and self._version is not None:
+            try:
+                self.camera_manager.calibration_store.save_reference_errors(self._version, learned)
+            except Exception as e:
+                print(f"Could not save reference calibration errors: {str(e)}")
+        self._check_drift()
+
+    @staticmethod
+    def _pair_key(index):
+        cam_a, cam_b = CALIBRATED_PAIRS[index][:2]
+        return f"{cam_a + 1}-{cam_b + 1}"
+
+    def _restore_reference(self, version):
+        """Use the reference errors saved for a version instead of learning them again."""
+        try:
+            saved = self.camera_manager.calibration_store.reference_errors(version) or {}
+        except Exception as e:
+            print(f"Could not read reference calibration errors: {str(e)}")
+            saved = {}
+        with self._lock:
+            for index in range(len(CALIBRATED_PAIRS)):
+                value = saved.get(self._pair_key(index))
+                if value is not None:
+                    self._reference[index] = value
+                    self._reference_count[index] = self.reference_samples
+
+    def _store_correspondences(self, pair, pts_a, pts_b):
+        with self._lock:
+            start = self._corr_count[pair]
+            idx = (start + np.arange(len(pts_a))) % self._corr_capacity
+            self._corr[pair][idx, 0] = pts_a
+            self._corr[pair][idx, 1] = pts_b
+            self._corr_count[pair] = start + len(pts_a)
+
+    def _rolling_stats(self):
+        """Vectorised per-pair statistics over the rolling window."""
+        with self._lock:
+            errors = self._errors.copy()
+            counts = np.minimum(self._next, self.window)
+            reference = self._reference.copy()
+        valid = counts > 0
+        stats = {
+            'count': counts,
+            'reference': reference,
+            'mean': np.full(len(counts), np.nan),
+            'median': np.full(len(counts), np.nan),
+            'p90': np.full(len(counts), np.nan),
+        }
+        if valid.any():
+            stats['mean'][valid] = np.nanmean(errors[valid], axis=1)
+            stats['median'][valid] = np.nanmedian(errors[valid], axis=1)
+            stats['p90'][valid] = np.nanpercentile(errors[valid], 90, axis=1)
+        stats['increase'] = stats['median'] - reference
+        stats['degraded'] = (counts >= self.min_samples) & (np.nan_to_num(stats['increase']) > self.threshold_px)
+        return stats
+
+    def _attribute(self, degraded, increase):
+        """
+        Cameras explaining the degraded pairs.
+
+        Only cameras whose monitored pairs have all degraded are candidates.
+        The candidates covering the most degraded pairs are taken first, so a
+        camera shared by two degraded pairs is blamed rather than both of its
+        neighbours.
+        """
+        num_cameras = len(self._alerting)
+        pairs_of = {cam: [i for i, p in enumerate(CALIBRATED_PAIRS) if cam in p[:2] and p[1] < num_cameras]
+                    for cam in range(num_cameras)}
+        candidates = [cam for cam, pairs in pairs_of.items() if pairs and all(degraded[i] for i in pairs)]
+        candidates.sort(key=lambda cam: (len(pairs_of[cam]), sum(increase[i] for i in pairs_of[cam])),
+                        reverse=True)
+
+        drifting = np.zeros(num_cameras, dtype=bool)
+        unexplained = set(np.flatnonzero(degraded))
+        for cam in candidates:
+            if unexplained & set(pairs_of[cam]):
+                drifting[cam] = True
+                unexplained -= set(pairs_of[cam])
+        return drifting, pairs_of
+
+    def _check_drift(self):
+        stats = self._rolling_stats()
+        drifting, pairs_of = self._attribute(stats['degraded'], np.nan_to_num(stats['increase']))
+        newly_drifting = drifting & ~self._alerting
+        self._alerting = drifting
+
+        for cam in np.flatnonzero(newly_drifting):
+            # Report the camera's least degraded pair, the evidence it is to blame
+            index = min(pairs_of[cam], key=lambda i: stats['increase'][i])
+            alert = {
+                'camera': int(cam) + 1,
+                'pairs': [[CALIBRATED_PAIRS[i][0] + 1, CALIBRATED_PAIRS[i][1] + 1] for i in pairs_of[cam]],
+                'median_px': float(stats['median'][index]),
+                'reference_px': float(stats['reference'][index]),
+                'increase_px': float(stats['increase'][index]),
+                'p90_px': float(stats['p90'][index]),
+                'threshold_px': self.threshold_px,
+                'timestamp': time.time()
+            }
+            print(f"Calibration drift detected on camera {alert['camera']}: median error "
+                  f"{alert['median_px']:.2f}px, {alert['increase_px']:.2f}px above reference")
+            if self.on_alert:
+                self.on_alert(alert)
+
+        if self.refine and stats['degraded'].any():
+            self._start_refinement(stats)
+
+    def _start_refinement(self, stats):
+        # Refine the most degraded pair
+        degraded = np.flatnonzero(stats['degraded'])
+        index = degraded[np.argmax(stats['increase'][degraded])]
+        cam_a, cam_b = CALIBRATED_PAIRS[index][:2]
+        with self._lock:
+            count = min(self._corr_count[(cam_a, cam_b)], self._corr_capacity)
+            keys = self._keys(self._corr[(cam_a, cam_b)][:count])
+            # A pair already tried under this version waits for new evidence
+            tried = self._refine_attempts.get(index)
+            if tried is not None and len(keys - tried) < self.retry_correspondences:
+                return
+        # Only one refinement at a time, so two fits never race to save
+        if not self._refine_lock.acquire(blocking=False):
+            return
+        with self._lock:
+            self._refine_attempts[index] = keys
+        try:
+            threading.Thread(target=self._refine_pair, args=(CALIBRATED_PAIRS[index],), daemon=True).start()
+        except Exception:
+            self._refine_lock.release()
+            raise
+
+    def _quantize(self, corr):
+        """Correspondences as integer rows; equal rows are the same observation."""
+        return np.round(corr.reshape(len(corr), 4) / self.distinct_px).astype(np.int64)
+
+    def _distinct(self, corr):
+        """Drop repeated observations of the same correspondence, e.g. a still marker."""
+        _, first = np.unique(self._quantize(corr), axis=0, return_index=True)
+        return corr[np.sort(first)]
+
+    def _keys(self, corr):
+        """Set identifying the distinct correspondences in corr."""
+        return set(map(tuple, self._quantize(corr).tolist()))
+
+    def _well_spread(self, corr):
+        """Whether a set has enough correspondences, not bunched on a line, to fit a pair."""
+        if len(corr) < self.min_correspondences:
+            return False
+        for view in (corr[:, 0], corr[:, 1]):
+            # Spread along the narrowest direction; near zero for collinear points
+            spread = np.linalg.svd(view - view.mean(axis=0), compute_uv=False)[-1] / np.sqrt(len(view))
+            if spread < self.min_spread_px:
+                return False
+        return True
+
+    def _refine_pair(self, pair):
+        """Re-estimate one pair's extrinsics from the buffered matches."""
+        try:
+            # Linux schedules threads individually; lower this one's priority
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+        except (AttributeError, OSError):
+            pass
+
+        cam_a, cam_b, R_name, t_name = pair
+        cm = self.camera_manager
+        try:
+            calibration = cm.calibration_store.snapshot
+            with self._lock:
+                count = min(self._corr_count[(cam_a, cam_b)], self._corr_capacity)
+                corr = self._distinct(self._corr[(cam_a, cam_b)][:count])
+
+            # Fit on half of the distinct correspondences and judge on the other half
+            order = np.random.default_rng(calibration.version).permutation(len(corr))
+            fit, held_out = corr[order[0::2]], corr[order[1::2]]
+            if not (self._well_spread(fit) and self._well_spread(held_out)):
+                print(f"Refinement for cameras {cam_a+1}-{cam_b+1} skipped: "
+                      f"{len(corr)} distinct correspondences are too few or too bunched")
+                return
+
+            R_new, t_new = cm.calibrate_pair(np.float32(fit[:, 0]), np.float32(fit[:, 1]))
+            if R_new is None:
+                return
+
+            current = self._pair_error(calibration.fundamental(cam_a, cam_b), held_out)
+            K_a, K_b = calibration.cameras[cam_a].K, calibration.cameras[cam_b].K
+            refined = self._pair_error(fundamental_from_extrinsics(R_new, t_new, K_a, K_b), held_out)
+            print(f"Refinement for cameras {cam_a+1}-{cam_b+1}: "
+                  f"{current:.2f}px -> {refined:.2f}px")
+            if not refined < current * (1 - self.min_improvement):
+                return
+            if cm.calibration_store.version != calibration.version:
+                print("Calibration changed during refinement; discarding the result")
+                return
+
+            setattr(cm, R_name, R_new)
+            setattr(cm, t_name, t_new)
+            cm.update_positions_from_extrinsics()
+            # Saving publishes a new calibration version, which resets the statistics
+            if cm.save_camera_config():
+                print("Saved refined calibration")
+        except Exception as e:
+            print(f"Calibration refinement failed: {str(e)}")
+            traceback.print_exc()
+        finally:
+            self._refine_lock.release()
+
+    def _pair_error(self, F, corr):
+        """Median Sampson error (pixels) of matched correspondences under F."""
+        errors = sampson_errors(F, to_homogeneous(corr[:, 0]), to_homogeneous(corr[:, 1]))
+        return float(np.median(errors))
+
+    def get_health(self):
+        """Summary of the rolling statistics for the dashboard."""
+        stats = self._rolling_stats()
+        num_cameras = len(self._alerting)
+
+        def px(value):
+            return None if np.isnan(value) else float(value)
+
+        return {
+            'threshold_px': self.threshold_px,
+            'pairs': [
+                {
+                    'cameras': [cam_a + 1, cam_b + 1],
+                    'reference_samples': int(self._reference_count[i]),
+                    'samples': int(stats['count'][i]),
+                    'reference_px': px(stats['reference'][i]),
+                    'mean_px': px(stats['mean'][i]),
+                    'median_px': px(stats['median'][i]),
+                    'p90_px': px(stats['p90'][i]),
+                    'increase_px': px(stats['increase'][i]),
+                    'degraded': bool(stats['degraded'][i])
+                }
+                for i, (cam_a, cam_b, _, _) in enumerate(CALIBRATED_PAIRS) if cam_b < num_cameras
+            ],
+            'cameras': [
+                {'camera': i + 1, 'drifting': bool(self._alerting[i])}
+                for i in range(num_cameras)
+            ],
+            'cpu_fraction': self._cpu_fraction,
+            'sample_interval': self.sample_interval
+        }
@@ -0,0 +1,385 @@
+import glob
+import json
+import os
+import re
+import tempfile
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime
+from functools import cached_property
+from itertools import combinations
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from geometry import skew
+
+
+POSITION_SCALE = 2.0  # Scale factor for reasonable distances
+
+
+def _frozen(array):
+    array = np.array(array, dtype=np.float64)
+    array.flags.writeable = False
+    return array
+
+
+def default_intrinsics(resolution):
+    """
+    Intrinsics matching the normalization used by calibrate_pair, which maps
+    pixels to [-1, 1] across the image.
+    """
+    half_w, half_h = resolution[0] / 2, resolution[1] / 2
+    return np.array([
+        [half_w, 0, half_w],
+        [0, half_h, half_h],
+        [0, 0, 1]
+    ])
+
+
+@dataclass(frozen=True, eq=False)
+class CameraCalibration:
+    """
+    Calibration of one camera.
+
+    R and t map world points into the camera frame (X_cam = R X_world + t).
+    Derived matrices are computed on first access and cached.
+    """
+    K: np.ndarray
+    R: np.ndarray
+    t: np.ndarray
+    resolution: Tuple[int, int]
+
+    @cached_property
+    def P(self):
+        """3x4 projection matrix from world points to pixels."""
+        return _frozen(self.K @ np.hstack([self.R, self.t.reshape(3, 1)]))
+
+    @cached_property
+    def center(self):
+        """Camera centre in world coordinates."""
+        return _frozen(-self.R.T @ self.t)
+
+    def to_dict(self):
+        return {
+            'K': self.K.tolist(),
+            'R': self.R.tolist(),
+            't': self.t.tolist(),
+            'resolution': list(self.resolution)
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(K=_frozen(data['K']), R=_frozen(data['R']), t=_frozen(data['t']),
+                   resolution=tuple(data['resolution']))
+
+    @classmethod
+    def from_pose(cls, R, center, resolution, K=None):
+        """Build a calibration from a world-to-camera rotation and a camera centre."""
+        R = np.asarray(R, dtype=np.float64)
+        K = default_intrinsics(resolution) if K is None else K
+        return cls(K=_frozen(K), R=_frozen(R), t=_frozen(-R @ np.asarray(center, dtype=np.float64)),
+                   resolution=tuple(resolution))
+
+
+@dataclass(frozen=True, eq=False)
+class CalibrationSnapshot:
+    """
+    Immutable view of one calibration version.
+
+    Consumers on hot paths hold a snapshot and read its cached matrices; a
+    new calibration produces a new snapshot rather than modifying this one.
+    """
+    version: int
+    timestamp: Optional[str]
+    cameras: Tuple[CameraCalibration, ...]
+    camera_positions: Tuple[Tuple[float, float, float], ...]
+    pair_extrinsics: Dict[str, np.ndarray] = field(default_factory=dict)
+    _fundamentals: Dict[Tuple[int, int], np.ndarray] = field(default_factory=dict, repr=False, compare=False)
+
+    @property
+    def is_calibrated(self):
+        return len(self.cameras) > 0
+
+    @property
+    def num_cameras(self):
+        return len(self.cameras)
+
+    def projection(self, index):
+        return self.cameras[index].P
+
+    def center(self, index):
+        return self.cameras[index].center
+
+    @cached_property
+    def centers(self):
+        return _frozen([camera.center for camera in self.cameras])
+
+    @cached_property
+    def pairs(self):
+        return tuple(combinations(range(len(self.cameras)), 2))
+
+    def fundamental(self, a, b):
+        """
+        Fundamental matrix with x_b^T F x_a = 0 for pixel coordinates.
+        """
+        key = (a, b)
+        F = self._fundamentals.get(key)
+        if F is None:
+            P_a, P_b = self.projection(a), self.projection(b)
+            epipole = P_b @ np.append(self.center(a), 1.0)
+            F = skew(epipole) @ P_b @ np.linalg.pinv(P_a)
+            F = _frozen(F / np.linalg.norm(F))
+            self._fundamentals[key] = F
+        return F
+
+    def warm(self):
+        """Compute every derived matrix so readers never do it on a hot path."""
+        for camera in self.cameras:
+            _ = camera.P, camera.center
+        _ = self.centers
+        for a, b in self.pairs:
+            self.fundamental(a, b)
+        return self
+
+    def to_config(self):
+        """JSON document for this snapshot, keeping the legacy keys readable."""
+        calibration_data = {
+            'timestamp': self.timestamp,
+            'num_cameras': len(self.camera_positions),
+            'resolution': [list(camera.resolution) for camera in self.cameras],
+        }
+        for name in ('R12', 't12', 'R23', 't23'):
+            value = self.pair_extrinsics.get(name)
+            calibration_data[name] = value.tolist() if value is not None else None
+        return {
+            'version': self.version,
+            'camera_positions': [list(p) for p in self.camera_positions],
+            'cameras': [camera.to_dict() for camera in self.cameras],
+            'calibration_data': calibration_data
+        }
+
+
+def cameras_from_chain(camera1_pos, chain, resolutions):
+    """
+    World-frame calibrations from chained pair extrinsics.
+
+    Each (R, t) in chain relates consecutive cameras as X_a = R X_b + t, as
+    returned by calibrate_pair. Camera 1 sits at camera1_pos with its axes
+    aligned to the world, matching how camera_positions are computed.
+    """
+    R_1 = np.eye(3)   # rotation from camera k to camera 1
+    t_1 = np.zeros(3) # camera k's origin in camera 1's frame
+    cameras = [CameraCalibration.from_pose(np.eye(3), camera1_pos, resolutions[0])]
+    for index, (R, t) in enumerate(chain, start=1):
+        t_1 = R_1 @ np.asarray(t, dtype=np.float64) + t_1
+        R_1 = R_1 @ np.asarray(R, dtype=np.float64)
+        center = np.asarray(camera1_pos, dtype=np.float64) + POSITION_SCALE * t_1
+        cameras.append(CameraCalibration.from_pose(R_1.T, center, resolutions[index]))
+    return tuple(cameras)
+
+
+class CalibrationStore:
+    """
+    Versioned calibration storage.
+
+    The current calibration is loaded from disk once and published as an
+    immutable CalibrationSnapshot with its derived matrices precomputed.
+    Every save writes the file atomically under a new version number and
+    keeps a copy in the history directory so earlier versions can be
+    restored with rollback().
+    """
+
+    def __init__(self, config_path, history_dir=None, keep_versions=20):
+        self.config_path = config_path
+        self.history_dir = history_dir or os.path.join(os.path.dirname(config_path), 'history')
+        self.keep_versions = keep_versions
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._snapshot = CalibrationSnapshot(version=0, timestamp=None, cameras=(), camera_positions=())
+        self._cache = {}  # version -> snapshot
+
+    @property
+    def snapshot(self):
+        """The current calibration; safe to read from any thread."""
+        return self._snapshot
+
+    @property
+    def version(self):
+        return self._snapshot.version
+
+    def load(self):
+        """
+        Load the current calibration from disk.
+
+        Returns:
+            The loaded snapshot, or None if there is no config file
+        """
+        if not os.path.exists(self.config_path):
+            return None
+        with open(self.config_path, 'r') as f:
+            config = json.load(f)
+        snapshot = self._snapshot_from_config(config)
+        self._archive(snapshot.version, config)
+        self._publish(snapshot)
+        return snapshot
+
+    def _archive(self, version, config):
+        """
+        Keep a history copy of a loaded version, so it can still be restored
+        once a later save replaces the current file (e.g. a shipped or legacy
+        config that was never saved through the store).
+        """
+        path = self._history_path(version)
+        if os.path.exists(path):
+            return
+        try:
+            with self._save_lock:
+                self._write_atomic(path, dict(config, version=version))
+        except OSError as e:
+            print(f"Could not archive calibration version {version}: {str(e)}")
+
+    def _snapshot_from_config(self, config):
+        calib_data = config.get('calibration_data', {})
+        pair_extrinsics = {
+            name: _frozen(calib_data[name])
+            for name in ('R12', 't12', 'R23', 't23') if calib_data.get(name)
+        }
+        positions = tuple(tuple(p) for p in config.get('camera_positions', []))
+
+        if config.get('cameras'):
+            cameras = tuple(CameraCalibration.from_dict(c) for c in config['cameras'])
+        elif len(pair_extrinsics) == 4 and positions:
+            # Older files only hold the chained pair extrinsics
+            resolutions = calib_data.get('resolution') or [(640, 480)] * 3
+            cameras = cameras_from_chain(positions[0], [
+                (pair_extrinsics['R12'], pair_extrinsics['t12']),
+                (pair_extrinsics['R23'], pair_extrinsics['t23'])
+            ], resolutions)
+        else:
+            cameras = ()
+
+        return CalibrationSnapshot(
+            version=int(config.get('version', 1)),
+            timestamp=calib_data.get('timestamp'),
+            cameras=cameras,
+            camera_positions=positions,
+            pair_extrinsics=pair_extrinsics
+        )
+
+    def _publish(self, snapshot):
+        snapshot.warm()
+        with self._lock:
+            self._cache[snapshot.version] = snapshot
+            # Only the most recent versions stay in memory
+            for version in sorted(self._cache)[:-self.keep_versions]:
+                del self._cache[version]
+            self._snapshot = snapshot
+
+    def save(self, camera_positions, cameras=(), pair_extrinsics=None):
+        """
+        Save a new calibration version and make it current.
+
+        Args:
+            camera_positions: Camera positions shown on the dashboard
+            cameras: Tuple of CameraCalibration in the world frame
+            pair_extrinsics: Legacy chained extrinsics (R12, t12, R23, t23)
+
+        Returns:
+            The new snapshot
+        """
+        with self._save_lock:
+            version = max([self._snapshot.version] + self.versions()) + 1
+            snapshot = CalibrationSnapshot(
+                version=version,
+                timestamp=datetime.now().isoformat(),
+                cameras=tuple(cameras),
+                camera_positions=tuple(tuple(float(v) for v in p) for p in camera_positions),
+                pair_extrinsics={k: _frozen(v) for k, v in (pair_extrinsics or {}).items() if v is not None}
+            )
+            config = snapshot.to_config()
+            # History first, so the current file never points at a missing version
+            self._write_atomic(self._history_path(version), config)
+            self._write_atomic(self.config_path, config)
+            self._prune_history()
+            self._publish(snapshot)
+        return snapshot
+
+    def _write_atomic(self, path, config):
+        directory = os.path.dirname(path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-', suffix='.json')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(config, f, indent=4)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _history_path(self, version):
+        name, ext = os.path.splitext(os.path.basename(self.config_path))
+        return os.path.join(self.history_dir, f"{name}.v{version}{ext}")
+
+    def versions(self):
+        """Versions available in the history directory, oldest first."""
+        name, ext = os.path.splitext(os.path.basename(self.config_path))
+        pattern = re.compile(re.escape(name) + r'\.v(\d+)' + re.escape(ext) + '$')
+        versions = []
+        for path in glob.glob(os.path.join(self.history_dir, f"{name}.v*{ext}")):
+            match = pattern.search(os.path.basename(path))
+            if match:
+                versions.append(int(match.group(1)))
+        return sorted(versions)
+
+    def _prune_history(self):
+        for version in self.versions()[:-self.keep_versions]:
+            os.remove(self._history_path(version))
+
+    def reference_errors(self, version):
+        """
+        Healthy per-pair errors recorded for a version by the calibration
+        monitor, as {'1-2': pixels, ...}, or None if none were recorded.
+        """
+        path = self._history_path(version)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r') as f:
+            return json.load(f).get('reference_errors')
+
+    def save_reference_errors(self, version, errors):
+        """
+        Record healthy per-pair errors with a version's history copy, so the
+        reference survives restarts. Existing entries for other pairs are kept.
+        """
+        with self._save_lock:
+            path = self._history_path(version)
+            if not os.path.exists(path):
+                return False
+            with open(path, 'r') as f:
+                config = json.load(f)
+            config.setdefault('reference_errors', {}).update(errors)
+            self._write_atomic(path, config)
+        return True
+
+    def get(self, version):
+        """Snapshot for a specific version, from memory or the history directory."""
+        snapshot = self._cache.get(version)
+        if snapshot is not None:
+            return snapshot
+        path = self._history_path(version)
+        if not os.path.exists(path):
+            raise KeyError(f"Calibration version {version} not found")
+        with open(path, 'r') as f:
+            return self._snapshot_from_config(json.load(f)).warm()
+
+    def rollback(self, version):
+        """
+        Restore an earlier calibration. It is saved as a new version so
+        version numbers only ever increase.
+        """
+        old = self.get(version)
+        return self.save(old.camera_positions, old.cameras, old.pair_extrinsics)
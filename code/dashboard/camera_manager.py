@@ -1,12 +1,15 @@
 import traceback
-import cv2
+import concurrent.futures
+import importlib
+import threading
 import numpy as np
-from pseyepy import Camera
 import time
 import math
 import os
-import json
-from datetime import datetime
+from geometry import to_homogeneous, match_epipolar, triangulate_points
+from calibration_store import CalibrationStore, cameras_from_chain, POSITION_SCALE
+from pose_history import LatencyEstimator
+from frame_buffers import FrameBuffers
 
 class CameraManager:
     def __init__(self):
@@ -15,38 +18,137 @@ class CameraManager:
         self.error_message = None
         self.streaming = False
         self.placeholder_frames = []
+        self.placeholder_jpegs = {}  # camera index -> encoded placeholder
+        self.frame_buffers = {}  # camera index -> FrameBuffers
         self.resolutions = []
         self.detect_dots = False
         self.camera_positions = []
+        self.latest_dots = [None] * self.num_cameras  # (dots, timestamp) per camera
+        self.latency = LatencyEstimator(self.num_cameras, fps=30)
         self.config_path = 'code/dashboard/config/camera_params.json'
         self.using_mock = False  # Track if we're using mock cameras
+        self.ready = False  # Set once camera discovery has finished
+        self.startup_status = {'stage': 'starting', 'message': 'Starting up', 'progress': 0.0}
+        self.startup_times = {}  # Seconds from process start to startup milestones
+        self._started_at = time.perf_counter()
+        self._on_progress = None
         
         # Create config directory if it doesn't exist
         os.makedirs(os.path.dirname(self.config_path), exist_ok=True)
+        self.calibration_store = CalibrationStore(self.config_path)
         # Load config first
         self.load_camera_config()
 
-    def initialize_cameras(self, mock_config="plane"):
+    def start_discovery(self, mock_config="plane", probe_timeout=5.0, on_progress=None, started_at=None):
+        """
+        Discover cameras on a background thread so the web server can start
+        serving immediately.
+        
+        Args:
+            mock_config: Configuration for mock cameras ("cube" or "plane")
+            probe_timeout: Seconds to wait for real cameras before using mocks
+            on_progress: Callback receiving startup_status whenever it changes
+            started_at: time.perf_counter() value startup times are measured from
+        """
+        self._on_progress = on_progress
+        if started_at is not None:
+            self._started_at = started_at
+        thread = threading.Thread(target=self.initialize_cameras, args=(mock_config, probe_timeout), daemon=True)
+        thread.start()
+        return thread
+
+    def _report_progress(self, stage, message, progress):
+        self.startup_status = {'stage': stage, 'message': message, 'progress': progress}
+        print(f"[startup] {message}")
+        if self._on_progress:
+            try:
+                self._on_progress(self.get_startup_status())
+            except Exception as e:
+                print(f"Error reporting startup progress: {str(e)}")
+
+    def mark_startup_time(self, name):
+        if name not in self.startup_times:
+            self.startup_times[name] = time.perf_counter() - self._started_at
+            print(f"[startup] {name.replace('_', ' ')}: {self.startup_times[name]:.3f}s")
+
+    def get_startup_status(self):
+        return dict(self.startup_status,
+                    ready=self.ready,
+                    using_mock=self.using_mock,
+                    error_message=self.error_message,
+                    times=dict(self.startup_times))
+
+    def _open_real_cameras(self):
+        """Open the PS3 Eye cameras, probing how many are connected first."""
+        pseyepy = importlib.import_module('pseyepy')
+        cam_count = getattr(pseyepy, 'cam_count', None)
+        if cam_count is not None:
+            available = cam_count()
+            if available < self.num_cameras:
+                raise RuntimeError(f"found {available} PS3 Eye cameras, need {self.num_cameras}")
+        Camera = pseyepy.Camera
+        return Camera(list(range(self.num_cameras)), fps=30, resolution=Camera.RES_LARGE, colour=True)
+
+    def _open_mock_cameras(self, mock_config):
+        from mock_camera import MockCamera
+        return MockCamera(list(range(self.num_cameras)), fps=[30] * self.num_cameras, resolution="large",
+                          colour=True, config=mock_config)
+
+    @staticmethod
+    def _run_in_background(fn, *args):
+        """
+        Run fn on a daemon thread and return a Future for its result.
+        Unlike an executor, a probe stuck in the USB driver cannot block exit.
+        """
+        future = concurrent.futures.Future()
+        
+        def run():
+            try:
+                future.set_result(fn(*args))
+            except Exception as e:
+                future.set_exception(e)
+        
+        threading.Thread(target=run, daemon=True).start()
+        return future
+
+    @staticmethod
+    def _release_late_cameras(future):
+        if future.exception() is None:
+            print("Real cameras responded after the probe timed out; closing them")
+            future.result().end()
+
+    def initialize_cameras(self, mock_config="plane", probe_timeout=5.0):
         """
         Initialize cameras with optional mock configuration.
         
+        The real camera probe, the mock fallback and the OpenCV import run in
+        parallel; if the probe does not finish within probe_timeout the mock
+        cameras are used.
+        
         Args:
             mock_config: Configuration for mock cameras ("cube" or "plane")
+            probe_timeout: Seconds to wait for real cameras before using mocks
         """
+        self._report_progress('probing', 'Probing PS3 Eye cameras...', 0.1)
+        cv2_future = self._run_in_background(importlib.import_module, 'cv2')
+        real_future = self._run_in_background(self._open_real_cameras)
+        mock_future = self._run_in_background(self._open_mock_cameras, mock_config)
+        
         try:
-            print("Attempting to initialize real PS3 Eye cameras...")
-            from pseyepy import Camera
-            self.cameras = Camera([0, 1, 2], fps=30, resolution=Camera.RES_LARGE, colour=True)
+            self.cameras = real_future.result(timeout=probe_timeout)
             print(f"Real cameras initialized: fps={self.cameras.fps}, resolution={self.cameras.resolution}, colour={self.cameras.colour}")
             self.using_mock = False
             
         except Exception as e:
+            if isinstance(e, concurrent.futures.TimeoutError):
+                e = f"no response after {probe_timeout}s"
+                # Release the cameras if the probe completes after all
+                real_future.add_done_callback(self._release_late_cameras)
             print(f"Failed to initialize real cameras: {str(e)}")
             print(f"Falling back to mock cameras with {mock_config} configuration...")
+            self._report_progress('fallback', 'PS3 Eye cameras not detected, using mock cameras', 0.5)
             try:
-                from mock_camera import MockCamera
-                self.cameras = MockCamera([0, 1, 2], fps=[30, 30, 30], resolution="large", 
-                                       colour=True, config=mock_config)
+                self.cameras = mock_future.result()
                 print(f"Mock cameras initialized successfully with {mock_config} configuration")
                 self.using_mock = True
                 self.error_message = f"Using mock cameras ({mock_config} config) - PS3 Eye cameras not detected"
@@ -57,58 +159,79 @@ class CameraManager:
                 
         finally:
             # Set up common parameters regardless of camera type
-            self.num_cameras = 3
             self.resolutions = [(640, 480)] * self.num_cameras
+            self.latest_dots = [None] * self.num_cameras
             
             # Only set default positions if none were loaded
             if not self.camera_positions:
                 self.camera_positions = [[0, 0, 0] for _ in range(self.num_cameras)]
-
-            # Create placeholder frames
-            self.placeholder_frames = []
-            for i in range(self.num_cameras):
-                width, height = self.resolutions[i]
-                placeholder = np.zeros((height, width, 3), dtype=np.uint8)
-                cv2.putText(placeholder, f"Camera {i+1}", (50, 50), 
-                           cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
-                self.placeholder_frames.append(placeholder)
-                
+        
+        try:
+            # Frames can only be drawn and encoded once OpenCV has loaded
+            try:
+                cv2_future.result()
+                self.create_placeholder_frames()
+            except Exception as e:
+                print(f"Failed to load OpenCV: {str(e)}")
+                cv2_error = f"OpenCV could not be loaded: {str(e)}"
+                self.error_message = f"{self.error_message}; {cv2_error}" if self.error_message else cv2_error
+                self._report_progress('error', cv2_error, 0.8)
+            
+            if self.cameras is not None:
+                self._report_progress('first_frame', 'Waiting for the first frame...', 0.8)
+                try:
+                    self.cameras.read(0)
+                    self.mark_startup_time('time_to_first_frame')
+                except Exception as e:
+                    print(f"Failed to read a first frame: {str(e)}")
+        finally:
+            # Discovery has finished either way; the dashboard must not wait forever
+            self.ready = True
+            self._report_progress('ready', 'Cameras ready' if self.cameras is not None else 'No cameras available', 1.0)
         return self.cameras is not None
 
-    def load_camera_config(self):
-        """
-        Load camera configuration from JSON file.
-        If file doesn't exist or is invalid, use default values.
-        """
-        try:
-            if os.path.exists(self.config_path):
-                with open(self.config_path, 'r') as f:
-                    config = json.load(f)
-                
-                # Load camera positions if they exist
-                if 'camera_positions' in config:
-                    self.camera_positions = config['camera_positions']
-                    print("Loaded camera positions from config:", self.camera_positions)
-                else:
-                    self.set_default_positions()
-                
-                # Load other calibration data
-                self.calibration_data = config.get('calibration_data', {})
-                print("Loaded calibration data from config")
-            else:
-                print("No config file found, using default positions")
-                self.set_default_positions()
-        except Exception as e:
-            print(f"Error loading config: {str(e)}")
-            self.set_default_positions()
+    def create_placeholder_frames(self):
+        import cv2
+        resolutions = self.resolutions or [(640, 480)] * self.num_cameras
+        placeholder_frames = []
+        for i in range(self.num_cameras):
+            width, height = resolutions[i]
+            placeholder = np.zeros((height, width, 3), dtype=np.uint8)
+            cv2.putText(placeholder, f"Camera {i+1}", (50, 50), 
+                       cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+            placeholder_frames.append(placeholder)
+        self.placeholder_frames = placeholder_frames
+        self.placeholder_jpegs = {}
+
+    def get_placeholder_frame(self, camera_index):
+        """JPEG of a camera's placeholder frame, encoded once and reused."""
+        import cv2
+        if camera_index >= self.num_cameras:
+            return None
+        if not self.placeholder_frames:
+            self.create_placeholder_frames()
+        jpeg = self.placeholder_jpegs.get(camera_index)
+        if jpeg is None:
+            _, buffer = cv2.imencode('.jpg', self.placeholder_frames[camera_index])
+            jpeg = self.placeholder_jpegs[camera_index] = memoryview(buffer)
+        return jpeg
 
+    def get_frame_buffers(self, camera_index, frame):
+        """Buffers for a camera, reallocated only if the frame size changes."""
+        buffers = self.frame_buffers.get(camera_index)
+        if buffers is None or not buffers.matches(frame):
+            buffers = self.frame_buffers[camera_index] = FrameBuffers(frame.shape[1], frame.shape[0])
+        return buffers
 
-    def detect_white_dots(self, frame):
-        # Convert to grayscale
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    def detect_white_dots(self, frame, buffers=None):
+        import cv2
+        # Convert to grayscale, into the camera's buffer when one is given
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY,
+                            dst=buffers.gray if buffers is not None else None)
         
         # Threshold the image to get white regions
-        _, thresh = cv2.threshold(gray, 155, 255, cv2.THRESH_BINARY)
+        _, thresh = cv2.threshold(gray, 155, 255, cv2.THRESH_BINARY,
+                                  dst=buffers.thresh if buffers is not None else None)
         
         # Find contours
         contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
@@ -130,29 +253,70 @@ class CameraManager:
         return dots
 
     def mark_dots(self, frame, dots):
+        import cv2
         for (x, y) in dots:
             cv2.drawMarker(frame, (x, y), (0, 0, 255), cv2.MARKER_STAR, 10, 3)
         return frame
 
-    def process_frame(self, frame):
+    def process_frame(self, frame, camera_index=None, timestamp=None, buffers=None, draw=True):
+        """
+        Detect and mark dots if enabled. With buffers, the markers are drawn on
+        the reusable preview buffer and the input frame is left untouched.
+        With draw False the dots are only detected, e.g. when nobody watches.
+        """
         if self.detect_dots:
-            dots = self.detect_white_dots(frame)
+            dots = self.detect_white_dots(frame, buffers)
+            if camera_index is not None:
+                # Keep the latest detections for reconstruction and the calibration monitor
+                self.latest_dots[camera_index] = (dots, timestamp)
+            if not draw:
+                return frame
+            if buffers is not None:
+                np.copyto(buffers.preview, frame)
+                frame = buffers.preview
             frame = self.mark_dots(frame, dots)
         return frame
 
-    def gen_frames(self, camera_index):
-        while True:
-            if self.streaming and self.cameras:
-                frame, timestamp = self.cameras.read(camera_index)
-                frame_bgr = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
-                frame_bgr = self.process_frame(frame_bgr)
-            else:
-                frame_bgr = self.placeholder_frames[camera_index]
-            
-            ret, buffer = cv2.imencode('.jpg', frame_bgr)
-            frame_bytes = buffer.tobytes()
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+    def capture_frame(self, camera_index, draw=True):
+        """
+        Capture one frame from a camera and run dot detection on it.
+        
+        Args:
+            camera_index: Camera to read
+            draw: Whether to draw the detected dots for the preview
+        
+        Returns:
+            The processed BGR frame, held in the camera's reusable buffers until
+            its next capture, or None while the cameras are not streaming
+        """
+        import cv2
+        if not (self.streaming and self.cameras):
+            return None
+        
+        frame, timestamp = self.cameras.read(camera_index)
+        self.latency.record(camera_index, timestamp)
+        buffers = self.get_frame_buffers(camera_index, frame)
+        cv2.cvtColor(frame, cv2.COLOR_RGB2BGR, dst=buffers.bgr)
+        return self.process_frame(buffers.bgr, camera_index, timestamp, buffers, draw)
+
+    def encode_frame(self, frame):
+        """
+        JPEG-encode a frame. The result is a memoryview over the encoder's
+        output so it is not copied again before being framed for the stream.
+        """
+        import cv2
+        ret, buffer = cv2.imencode('.jpg', frame)
+        return memoryview(buffer)
+
+    def get_frame(self, camera_index):
+        """
+        Capture, process and JPEG-encode one frame from a camera.
+        Returns the placeholder frame while the cameras are not streaming.
+        """
+        frame = self.capture_frame(camera_index)
+        if frame is None:
+            return self.get_placeholder_frame(camera_index)
+        return self.encode_frame(frame)
 
     def update_camera_settings(self, exposure, gain):
         try:
@@ -209,6 +373,64 @@ class CameraManager:
             'timestamp': time.time()  # Add timestamp for frontend to detect updates
         }
     
+    def reconstruct_markers(self, max_skew=0.05, gate_px=15.0, merge_radius=0.1):
+        """
+        Triangulate the latest detections of every calibrated camera pair.
+        
+        Returns:
+            (points, timestamp, cameras) with points as an (N, 3) array in the
+            same frame as camera_positions and cameras the sorted indices of
+            the cameras that contributed, or (None, None, None) if nothing
+            was reconstructed
+        """
+        # Hot path: read the current snapshot, never the file
+        calibration = self.calibration_store.snapshot
+        if not calibration.is_calibrated:
+            return None, None, None
+        
+        latest = list(self.latest_dots)
+        reconstructed = []
+        timestamps = []
+        cameras = set()
+        for cam_a, cam_b in calibration.pairs:
+            if latest[cam_a] is None or latest[cam_b] is None:
+                continue
+            (dots_a, ts_a), (dots_b, ts_b) = latest[cam_a], latest[cam_b]
+            if ts_a is None or ts_b is None or abs(ts_a - ts_b) > max_skew:
+                continue
+            
+            pts_a = to_homogeneous(dots_a)
+            pts_b = to_homogeneous(dots_b)
+            idx_a, idx_b, _ = match_epipolar(calibration.fundamental(cam_a, cam_b), pts_a, pts_b, gate_px)
+            if len(idx_a) == 0:
+                continue
+            
+            X = triangulate_points(calibration.projection(cam_a), calibration.projection(cam_b),
+                                   pts_a[idx_a], pts_b[idx_b])
+            # Drop points behind either camera
+            camera_a, camera_b = calibration.cameras[cam_a], calibration.cameras[cam_b]
+            in_front = ((X @ camera_a.R[2] + camera_a.t[2]) > 0) & ((X @ camera_b.R[2] + camera_b.t[2]) > 0)
+            reconstructed.append(X[in_front])
+            timestamps.append(max(ts_a, ts_b))
+            cameras.update((cam_a, cam_b))
+        
+        if not reconstructed:
+            return None, None, None
+        
+        points = reconstructed[0]
+        for extra in reconstructed[1:]:
+            if len(points) == 0 or len(extra) == 0:
+                points = np.vstack([points, extra])
+                continue
+            # Markers seen by several pairs are reconstructed more than once; average them
+            dist = np.linalg.norm(extra[:, None, :] - points[None, :, :], axis=2)
+            nearest = dist.argmin(axis=1)
+            duplicate = dist[np.arange(len(extra)), nearest] < merge_radius
+            points[nearest[duplicate]] = (points[nearest[duplicate]] + extra[duplicate]) / 2
+            points = np.vstack([points, extra[~duplicate]])
+        
+        return points, max(timestamps), sorted(cameras)
+    
     def calibrate_pair(self, pts1, pts2):
         """
         Calibrate a pair of cameras using the 8-point algorithm.
@@ -284,6 +506,7 @@ class CameraManager:
         """
         Calibrate all three cameras and save the configuration.
         """
+        import cv2
         try:
             if not self.streaming:
                 return False, "Cameras must be streaming to perform calibration", None
@@ -322,27 +545,15 @@ class CameraManager:
             self.R23 = R23
             self.t23 = t23
             
-            # 5. Calculate camera positions
-            scale = 2.0  # Scale factor for reasonable distances
-            
-            # Camera 2 relative to Camera 1
-            camera2_pos = camera1_pos + scale * t12
-            
-            # Camera 3 relative to Camera 2
-            t23_global = camera2_pos + scale * (R12 @ t23)
-            camera3_pos = t23_global
-            
-            # 6. Update camera positions
-            self.camera_positions[0] = camera1_pos.tolist()
-            self.camera_positions[1] = camera2_pos.tolist()
-            self.camera_positions[2] = camera3_pos.tolist()
+            # 5. Calculate and update camera positions
+            self.update_positions_from_extrinsics(camera1_pos)
             
             print("\nCamera positions after calibration:")
             print("Camera 1:", self.camera_positions[0])
             print("Camera 2:", self.camera_positions[1])
             print("Camera 3:", self.camera_positions[2])
             
-            # 7. Save the configuration
+            # 6. Save the configuration
             if self.save_camera_config():
                 print("Calibration configuration saved successfully")
             else:
@@ -358,41 +569,40 @@ class CameraManager:
             return False, error_msg, None
 
 
+    def update_positions_from_extrinsics(self, camera1_pos=None):
+        """
+        Recompute camera positions from the chained pair extrinsics.
+        Camera 1 keeps its current position unless one is given.
+        """
+        if camera1_pos is None:
+            camera1_pos = self.camera_positions[0]
+        camera1_pos = np.asarray(camera1_pos, dtype=np.float64)
+        
+        # Camera 2 relative to Camera 1
+        camera2_pos = camera1_pos + POSITION_SCALE * self.t12
+        
+        # Camera 3 relative to Camera 2
+        camera3_pos = camera2_pos + POSITION_SCALE * (self.R12 @ self.t23)
+        
+        self.camera_positions[0] = camera1_pos.tolist()
+        self.camera_positions[1] = camera2_pos.tolist()
+        self.camera_positions[2] = camera3_pos.tolist()
+        return self.camera_positions
+
     def load_camera_config(self):
         """
-        Load camera configuration from JSON file.
+        Load camera configuration through the calibration store.
         If file doesn't exist or is invalid, use default values.
         """
         try:
-            if os.path.exists(self.config_path):
-                with open(self.config_path, 'r') as f:
-                    config = json.load(f)
-                
-                # Load camera positions
-                if 'camera_positions' in config:
-                    self.camera_positions = config['camera_positions']
-                    print("Loaded camera positions from config:", self.camera_positions)
-                else:
-                    self.set_default_positions()
-                
-                # Load calibration data including transformation matrices
-                if 'calibration_data' in config:
-                    calib_data = config['calibration_data']
-                    if calib_data.get('R12') and calib_data.get('t12'):
-                        self.R12 = np.array(calib_data['R12'])
-                        self.t12 = np.array(calib_data['t12'])
-                    if calib_data.get('R23') and calib_data.get('t23'):
-                        self.R23 = np.array(calib_data['R23'])
-                        self.t23 = np.array(calib_data['t23'])
-                    print("Loaded calibration matrices from config")
-            else:
+            snapshot = self.calibration_store.load()
+            if snapshot is None:
                 print("No config file found, using default positions")
                 self.set_default_positions()
-                
-            # Ensure camera_positions is initialized
-            if not self.camera_positions:
-                self.set_default_positions()
-                
+                return True
+            
+            self.apply_calibration(snapshot)
+            print(f"Loaded calibration version {snapshot.version} from config")
             return True
                 
         except Exception as e:
@@ -400,6 +610,50 @@ class CameraManager:
             self.set_default_positions()
             return False
 
+    def apply_calibration(self, snapshot):
+        """
+        Make the manager's camera positions and chained extrinsics match a
+        calibration snapshot, so the next save starts from that calibration.
+        """
+        # Load camera positions
+        if snapshot.camera_positions:
+            self.camera_positions = [list(p) for p in snapshot.camera_positions]
+            print("Loaded camera positions from config:", self.camera_positions)
+        else:
+            self.set_default_positions()
+        
+        # Keep the chained pair extrinsics for recalibration and refinement;
+        # clear any the snapshot does not have so they are not saved again
+        for name in ('R12', 't12', 'R23', 't23'):
+            value = snapshot.pair_extrinsics.get(name)
+            setattr(self, name, np.array(value) if value is not None else None)
+
+    def rollback_calibration(self, version):
+        """
+        Restore an earlier calibration version.
+        
+        The store saves the restored calibration as a new version and the
+        manager reloads its state from it.
+        
+        Args:
+            version: Calibration version to restore
+        
+        Returns:
+            (success, message)
+        """
+        try:
+            snapshot = self.calibration_store.rollback(version)
+        except KeyError as e:
+            return False, str(e.args[0])
+        except Exception as e:
+            print(f"Error rolling back calibration: {str(e)}")
+            traceback.print_exc()
+            return False, f"Rollback failed: {str(e)}"
+        
+        self.apply_calibration(snapshot)
+        print(f"Restored calibration version {version} as version {snapshot.version}")
+        return True, f"Restored calibration version {version} as version {snapshot.version}"
+
     def set_default_positions(self):
         """Set default camera positions"""
         self.camera_positions = [
@@ -410,32 +664,22 @@ class CameraManager:
             
     def save_camera_config(self):
         """
-        Save current camera configuration to JSON file.
-        Includes camera positions and calibration metadata.
+        Save current camera configuration as a new calibration version.
+        Includes camera positions, the chained pair extrinsics and the
+        world-frame calibration of every camera derived from them.
         """
         try:
-            # Ensure the directory exists
-            os.makedirs(os.path.dirname(self.config_path), exist_ok=True)
+            pair_extrinsics = {name: getattr(self, name, None) for name in ('R12', 't12', 'R23', 't23')}
+            cameras = ()
+            if all(value is not None for value in pair_extrinsics.values()):
+                cameras = cameras_from_chain(self.camera_positions[0],
+                                             [(self.R12, self.t12), (self.R23, self.t23)],
+                                             self.resolutions)
             
-            config = {
-                'camera_positions': self.camera_positions,
-                'calibration_data': {
-                    'timestamp': datetime.now().isoformat(),
-                    'num_cameras': self.num_cameras,
-                    'resolution': self.resolutions,
-                    'R12': self.R12.tolist() if hasattr(self, 'R12') else None,
-                    't12': self.t12.tolist() if hasattr(self, 't12') else None,
-                    'R23': self.R23.tolist() if hasattr(self, 'R23') else None,
-                    't23': self.t23.tolist() if hasattr(self, 't23') else None
-                }
-            }
-            
-            with open(self.config_path, 'w') as f:
-                json.dump(config, f, indent=4)
-            
-            print("Saved camera configuration to", self.config_path)
+            snapshot = self.calibration_store.save(self.camera_positions, cameras, pair_extrinsics)
+            print(f"Saved camera configuration version {snapshot.version} to", self.config_path)
             return True
         except Exception as e:
             print(f"Error saving config: {str(e)}")
             traceback.print_exc()  # This will print the full error traceback
-            return False
\ No newline at end of file
+            return False
@@ -0,0 +1,22 @@
+import numpy as np
+
+
+class FrameBuffers:
+    """
+    Per-camera buffers reused by every frame of the stream.
+
+    OpenCV calls on the frame path write into these through their dst
+    arguments, so a steady stream does not allocate new frame-sized arrays.
+    The overlay is drawn on preview, leaving bgr untouched for detection.
+    """
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.bgr = np.zeros((height, width, 3), dtype=np.uint8)
+        self.gray = np.zeros((height, width), dtype=np.uint8)
+        self.thresh = np.zeros((height, width), dtype=np.uint8)
+        self.preview = np.zeros((height, width, 3), dtype=np.uint8)
+
+    def matches(self, frame):
+        return frame.shape[0] == self.height and frame.shape[1] == self.width
@@ -0,0 +1,108 @@
+import numpy as np
+
+
+def to_homogeneous(points):
+    """(N, 2) pixel coordinates as an (N, 3) array of homogeneous points."""
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    out = np.ones((len(points), 3))
+    out[:, :2] = points
+    return out
+
+
+def skew(v):
+    """Cross-product matrix [v]x of a 3-vector."""
+    return np.array([
+        [0, -v[2], v[1]],
+        [v[2], 0, -v[0]],
+        [-v[1], v[0], 0]
+    ])
+
+
+def essential_from_extrinsics(R, t):
+    """
+    Essential matrix for a pair calibrated by calibrate_pair.
+
+    calibrate_pair solves p1^T E p2 = 0 with E = [t]x R, i.e. X1 = R X2 + t.
+    The transpose is returned so the result follows the usual x_b^T F x_a = 0
+    convention with a = first camera and b = second camera.
+    """
+    return (skew(np.asarray(t, dtype=np.float64)) @ np.asarray(R, dtype=np.float64)).T
+
+
+def fundamental_from_extrinsics(R, t, K_a, K_b):
+    """
+    Fundamental matrix (x_b^T F x_a = 0, pixel coordinates) for a pair
+    related by calibrate_pair's extrinsics.
+    """
+    E = essential_from_extrinsics(R, t)
+    return np.linalg.inv(K_b).T @ E @ np.linalg.inv(K_a)
+
+
+def sampson_error_matrix(F, pts_a, pts_b):
+    """
+    First-order geometric (Sampson) error for every pairing of two point sets.
+
+    Args:
+        F: 3x3 matrix with x_b^T F x_a = 0
+        pts_a: (Na, 3) homogeneous points in the first image
+        pts_b: (Nb, 3) homogeneous points in the second image
+
+    Returns:
+        (Na, Nb) array of distances in the units of the input coordinates
+    """
+    Fa = pts_a @ F.T          # rows are F x_a
+    Fb = pts_b @ F            # rows are F^T x_b
+    algebraic = Fa @ pts_b.T  # x_b^T F x_a, shape (Na, Nb)
+    denom = (Fa[:, 0:1] ** 2 + Fa[:, 1:2] ** 2) + (Fb[:, 0] ** 2 + Fb[:, 1] ** 2)[None, :]
+    return np.abs(algebraic) / np.sqrt(np.maximum(denom, 1e-12))
+
+
+def sampson_errors(F, pts_a, pts_b):
+    """Sampson error for already matched points, row i of pts_a with row i of pts_b."""
+    Fa = pts_a @ F.T
+    Fb = pts_b @ F
+    algebraic = np.einsum('ij,ij->i', Fa, pts_b)
+    denom = Fa[:, 0] ** 2 + Fa[:, 1] ** 2 + Fb[:, 0] ** 2 + Fb[:, 1] ** 2
+    return np.abs(algebraic) / np.sqrt(np.maximum(denom, 1e-12))
+
+
+def match_epipolar(F, pts_a, pts_b, max_error):
+    """
+    Match two point sets by mutual nearest neighbour under the Sampson error.
+
+    Returns:
+        (idx_a, idx_b, errors) arrays for the accepted matches
+    """
+    if len(pts_a) == 0 or len(pts_b) == 0:
+        empty = np.zeros(0, dtype=np.intp)
+        return empty, empty, np.zeros(0)
+
+    errors = sampson_error_matrix(F, pts_a, pts_b)
+    best_b = errors.argmin(axis=1)
+    best_a = errors.argmin(axis=0)
+    idx_a = np.arange(len(pts_a))
+    mutual = best_a[best_b] == idx_a
+    match_errors = errors[idx_a, best_b]
+    keep = mutual & (match_errors < max_error)
+    return idx_a[keep], best_b[keep], match_errors[keep]
+
+
+def triangulate_points(P_a, P_b, pts_a, pts_b):
+    """
+    Linear (DLT) triangulation of matched points, vectorised over all points.
+
+    Args:
+        P_a, P_b: 3x4 projection matrices
+        pts_a, pts_b: (N, 3) homogeneous image points, row i matched to row i
+
+    Returns:
+        (N, 3) array of 3D points
+    """
+    A = np.empty((len(pts_a), 4, 4))
+    A[:, 0] = pts_a[:, 0:1] * P_a[2] - P_a[0]
+    A[:, 1] = pts_a[:, 1:2] * P_a[2] - P_a[1]
+    A[:, 2] = pts_b[:, 0:1] * P_b[2] - P_b[0]
+    A[:, 3] = pts_b[:, 1:2] * P_b[2] - P_b[1]
+    _, _, Vt = np.linalg.svd(A)
+    X = Vt[:, -1]
+    return X[:, :3] / X[:, 3:4]
@@ -0,0 +1,137 @@
+import math
+import struct
+import threading
+import time
+
+import numpy as np
+
+
+# Binary frame layout (little endian):
+#   header  : magic 'MKR1', uint16 n_points, uint16 n_tracks, uint16 trail_length,
+#             uint16 n_bodies, float64 timestamp                      (20 bytes)
+#   float32 : points      n_points * 3
+#   float32 : trails      n_tracks * trail_length * 3 (oldest to newest)
+#   float32 : bodies      n_bodies * 7 (x, y, z, qx, qy, qz, qw)
+#   uint16  : track ids   n_tracks
+#   uint8   : trail counts n_tracks
+# All float sections start on a 4-byte boundary so the client can view them
+# directly as Float32Arrays.
+FRAME_MAGIC = b'MKR1'
+FRAME_HEADER = struct.Struct('<4sHHHHd')
+
+
+def pack_marker_frame(timestamp, points, track_ids=None, trails=None, trail_counts=None, bodies=()):
+    """
+    Pack one frame of marker data into the compact binary layout above.
+
+    Args:
+        timestamp: Capture time of the frame
+        points: (N, 3) marker positions
+        track_ids: (T,) track ids, or None to send no tracks
+        trails: (T, L, 3) trail positions, oldest to newest
+        trail_counts: (T,) number of real points in each trail
+        bodies: Iterable of (body_id, position, quaternion)
+
+    Returns:
+        bytes ready to be emitted as a Socket.IO binary payload
+    """
+    points = np.asarray(points, dtype=np.float32).reshape(-1, 3)
+    if track_ids is None or len(track_ids) == 0:
+        track_ids = np.zeros(0, dtype=np.uint16)
+        trails = np.zeros((0, 0, 3), dtype=np.float32)
+        trail_counts = np.zeros(0, dtype=np.uint8)
+    trail_length = trails.shape[1]
+    bodies = list(bodies)
+    body_data = np.zeros((len(bodies), 7), dtype=np.float32)
+    for i, (_, position, quaternion) in enumerate(bodies):
+        body_data[i, :3] = position
+        body_data[i, 3:] = quaternion
+
+    header = FRAME_HEADER.pack(FRAME_MAGIC, len(points), len(track_ids), trail_length,
+                               len(bodies), timestamp)
+    return b''.join((
+        header,
+        points.tobytes(),
+        np.asarray(trails, dtype=np.float32).tobytes(),
+        body_data.tobytes(),
+        np.asarray(track_ids, dtype=np.uint16).tobytes(),
+        np.minimum(trail_counts, 255).astype(np.uint8).tobytes(),
+    ))
+
+
+def decimate(count, max_count):
+    """Evenly spaced indices selecting at most max_count of count items."""
+    if count <= max_count:
+        return slice(None)
+    return slice(None, None, math.ceil(count / max_count))
+
+
+class MarkerStreamer:
+    """
+    Sends marker frames to each 3D viewer at the rate and density it asked for.
+
+    Frames are packed once per distinct viewer setting on each update, so the
+    cost grows with the number of different settings rather than viewers.
+    """
+
+    def __init__(self, emit, max_rate=60.0, max_points=1024):
+        """
+        Args:
+            emit: Callable (payload, sid) sending a binary frame to one viewer
+            max_rate: Highest rate (Hz) a viewer may request
+            max_points: Highest number of points a viewer may request
+        """
+        self.emit = emit
+        self.max_rate = max_rate
+        self.max_points = max_points
+        self._viewers = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, sid, rate=30.0, max_points=512, trails=True):
+        rate = min(max(float(rate), 1.0), self.max_rate)
+        max_points = min(max(int(max_points), 1), self.max_points)
+        with self._lock:
+            self._viewers[sid] = {
+                'interval': 1.0 / rate,
+                'max_points': max_points,
+                'trails': bool(trails),
+                'next_send': 0.0
+            }
+        return {'rate': rate, 'max_points': max_points, 'trails': bool(trails)}
+
+    def unsubscribe(self, sid):
+        with self._lock:
+            self._viewers.pop(sid, None)
+
+    def publish(self, points, timestamp, tracks=None, bodies=()):
+        """
+        Send the latest reconstruction to every viewer that is due a frame.
+
+        Args:
+            points: (N, 3) marker positions
+            timestamp: Capture time of the points
+            tracks: (ids, trails, trail_counts) from MarkerTracker.get_tracks, or None
+            bodies: Body poses from MarkerTracker.get_bodies
+        """
+        now = time.monotonic()
+        with self._lock:
+            due = [(sid, viewer) for sid, viewer in self._viewers.items() if viewer['next_send'] <= now]
+            for _, viewer in due:
+                viewer['next_send'] = now + viewer['interval']
+        if not due:
+            return
+
+        ids, trails, counts = tracks if tracks is not None else (None, None, None)
+
+        packed = {}
+        for sid, viewer in due:
+            key = (viewer['max_points'], viewer['trails'])
+            if key not in packed:
+                selection = decimate(len(points), viewer['max_points'])
+                if viewer['trails'] and ids is not None:
+                    track_selection = decimate(len(ids), viewer['max_points'])
+                    packed[key] = pack_marker_frame(timestamp, points[selection], ids[track_selection],
+                                                    trails[track_selection], counts[track_selection], bodies)
+                else:
+                    packed[key] = pack_marker_frame(timestamp, points[selection], bodies=bodies)
+            self.emit(packed[key], sid)
@@ -0,0 +1,171 @@
+import numpy as np
+
+
+class MarkerTracker:
+    """
+    Associates reconstructed markers across frames and keeps short trails.
+
+    Track state lives in fixed-size arrays allocated up front, so the number
+    of tracks and trail points is bounded. Each update still builds small
+    temporaries (the track-to-point distance matrix and indexed copies), as
+    does get_tracks, sized by the markers in the frame.
+
+    Tracks are matched to new points by mutual nearest neighbour within
+    max_distance; unmatched points start new tracks and tracks that go
+    unmatched for more than max_missed frames are dropped.
+    """
+
+    def __init__(self, max_tracks=256, trail_length=16, max_distance=0.1, max_missed=5):
+        self.max_tracks = max_tracks
+        self.trail_length = trail_length
+        self.max_distance = max_distance
+        self.max_missed = max_missed
+
+        self.positions = np.zeros((max_tracks, 3))
+        self.ids = np.zeros(max_tracks, dtype=np.uint16)
+        self.active = np.zeros(max_tracks, dtype=bool)
+        self.missed = np.zeros(max_tracks, dtype=np.int32)
+        self.trails = np.zeros((max_tracks, trail_length, 3))
+        self.trail_count = np.zeros(max_tracks, dtype=np.int32)
+        self.trail_head = np.zeros(max_tracks, dtype=np.int32)
+        self._next_id = 0
+
+        # Pose of the tracked marker cluster, kept for axis stability
+        self.body_position = None
+        self.body_rotation = None
+        self.timestamp = None
+
+    def reset(self):
+        """Drop every track, e.g. when a new calibration changes the world frame."""
+        self.active[:] = False
+        self.missed[:] = 0
+        self.trail_count[:] = 0
+        self.trail_head[:] = 0
+        self.body_position = None
+        self.body_rotation = None
+        self.timestamp = None
+
+    def update(self, points, timestamp):
+        """
+        Update the tracks with a new set of reconstructed points.
+
+        Args:
+            points: (N, 3) array of marker positions
+            timestamp: Capture time of the points
+        """
+        self.timestamp = timestamp
+        slots = np.flatnonzero(self.active)
+        matched_points = np.zeros(len(points), dtype=bool)
+
+        if len(slots) and len(points):
+            dist = np.linalg.norm(self.positions[slots][:, None, :] - points[None, :, :], axis=2)
+            best_point = dist.argmin(axis=1)
+            best_track = dist.argmin(axis=0)
+            mutual = best_track[best_point] == np.arange(len(slots))
+            close = dist[np.arange(len(slots)), best_point] < self.max_distance
+            hit = mutual & close
+
+            hit_slots = slots[hit]
+            self.positions[hit_slots] = points[best_point[hit]]
+            self.missed[hit_slots] = 0
+            self._append_trail(hit_slots)
+            matched_points[best_point[hit]] = True
+            lost = slots[~hit]
+        else:
+            lost = slots
+
+        # Age tracks that were not seen this frame
+        self.missed[lost] += 1
+        self.active[lost[self.missed[lost] > self.max_missed]] = False
+
+        # Start new tracks for unmatched points while there is room
+        new_points = points[~matched_points]
+        free = np.flatnonzero(~self.active)[:len(new_points)]
+        if len(free):
+            count = len(free)
+            self.positions[free] = new_points[:count]
+            self.ids[free] = (self._next_id + np.arange(count)) % 65536
+            self._next_id = (self._next_id + count) % 65536
+            self.active[free] = True
+            self.missed[free] = 0
+            self.trail_count[free] = 0
+            self.trail_head[free] = 0
+            self._append_trail(free)
+
+        self._update_body()
+
+    def _append_trail(self, slots):
+        self.trails[slots, self.trail_head[slots]] = self.positions[slots]
+        self.trail_head[slots] = (self.trail_head[slots] + 1) % self.trail_length
+        self.trail_count[slots] = np.minimum(self.trail_count[slots] + 1, self.trail_length)
+
+    def get_tracks(self):
+        """
+        Currently visible tracks.
+
+        Returns:
+            (ids, positions, trails, trail_counts) where trails is ordered
+            oldest to newest and padded with the oldest point
+        """
+        slots = np.flatnonzero(self.active & (self.missed == 0))
+        order = (self.trail_head[slots, None] + np.arange(self.trail_length)[None, :]) % self.trail_length
+        counts = self.trail_count[slots]
+        # Slots before the first written entry repeat the oldest real point
+        first = self.trail_length - counts
+        order = np.where(np.arange(self.trail_length)[None, :] < first[:, None],
+                         order[np.arange(len(slots)), first][:, None], order)
+        trails = self.trails[slots[:, None], order]
+        return self.ids[slots], self.positions[slots], trails, counts
+
+    def _update_body(self):
+        """
+        Estimate the pose of the visible marker cluster as a single rigid body.
+
+        The origin is the centroid and the axes are the principal directions
+        of the markers, with signs kept consistent between frames.
+        """
+        visible = self.positions[self.active & (self.missed == 0)]
+        if len(visible) < 3:
+            self.body_position = None
+            self.body_rotation = None
+            return
+
+        centroid = visible.mean(axis=0)
+        _, _, Vt = np.linalg.svd(visible - centroid)
+        axes = Vt.T
+        if self.body_rotation is not None:
+            signs = np.sign(np.sum(axes * self.body_rotation, axis=0))
+            axes = axes * np.where(signs == 0, 1, signs)
+        if np.linalg.det(axes) < 0:
+            axes[:, 2] = -axes[:, 2]
+
+        self.body_position = centroid
+        self.body_rotation = axes
+
+    def get_bodies(self):
+        """
+        Returns:
+            List of (body_id, position, quaternion) with quaternions as (x, y, z, w)
+        """
+        if self.body_position is None:
+            return []
+        return [(0, self.body_position, rotation_to_quaternion(self.body_rotation))]
+
+
+def rotation_to_quaternion(R):
+    """Convert a rotation matrix to a unit quaternion (x, y, z, w)."""
+    trace = R[0, 0] + R[1, 1] + R[2, 2]
+    if trace > 0:
+        s = 2.0 * np.sqrt(trace + 1.0)
+        q = [(R[2, 1] - R[1, 2]) / s, (R[0, 2] - R[2, 0]) / s, (R[1, 0] - R[0, 1]) / s, 0.25 * s]
+    elif R[0, 0] > R[1, 1] and R[0, 0] > R[2, 2]:
+        s = 2.0 * np.sqrt(1.0 + R[0, 0] - R[1, 1] - R[2, 2])
+        q = [0.25 * s, (R[0, 1] + R[1, 0]) / s, (R[0, 2] + R[2, 0]) / s, (R[2, 1] - R[1, 2]) / s]
+    elif R[1, 1] > R[2, 2]:
+        s = 2.0 * np.sqrt(1.0 + R[1, 1] - R[0, 0] - R[2, 2])
+        q = [(R[0, 1] + R[1, 0]) / s, 0.25 * s, (R[1, 2] + R[2, 1]) / s, (R[0, 2] - R[2, 0]) / s]
+    else:
+        s = 2.0 * np.sqrt(1.0 + R[2, 2] - R[0, 0] - R[1, 1])
+        q = [(R[0, 2] + R[2, 0]) / s, (R[1, 2] + R[2, 1]) / s, 0.25 * s, (R[1, 0] - R[0, 1]) / s]
+    q = np.array(q)
+    return q / np.linalg.norm(q)
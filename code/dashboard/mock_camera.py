@@ -38,6 +38,10 @@ class MockCamera:
         
         # Initialize patterns based on selected configuration
         self._patterns = self._get_patterns(config)
+        
+        # Pre-rendered patterns and reusable output frames
+        self._base_frames = [self._render_pattern(i) for i in range(self.num_cameras)]
+        self._frames = [np.empty_like(base) for base in self._base_frames]
 
     def _get_patterns(self, config: str) -> List[DotPattern]:
         """Get dot patterns based on configuration."""
@@ -147,42 +151,33 @@ class MockCamera:
                 timestamps.append(timestamp)
             return frames, timestamps
     
-    def _generate_frame(self, camera_index: int) -> Tuple[np.ndarray, float]:
-        """Generate a single synthetic frame with bright white dots."""
-        # Create base frame (dark background)
+    def _render_pattern(self, camera_index: int) -> np.ndarray:
+        """Draw a camera's dot pattern once at full brightness."""
         if self._colour:
-            frame = np.zeros((self._height, self._width, 3), dtype=np.uint8)
+            base = np.zeros((self._height, self._width, 3), dtype=np.uint8)
+            white = (255, 255, 255)
         else:
-            frame = np.zeros((self._height, self._width), dtype=np.uint8)
-            
-        # Draw dots
-        pattern = self._patterns[camera_index]
-        for x, y in pattern.positions:
-            # Create a bright white dot
-            dot_size = 8  # Large dots for better visibility
-            dot = np.zeros((dot_size*2+1, dot_size*2+1), dtype=np.uint8)
-            cv2.circle(dot, (dot_size, dot_size), dot_size-2, 255, -1)
-            
-            # Place dot in frame
-            y1, y2 = max(0, y-dot_size), min(self._height, y+dot_size+1)
-            x1, x2 = max(0, x-dot_size), min(self._width, x+dot_size+1)
-            dy1, dy2 = max(0, dot_size-y), dot_size*2+1 - max(0, (y+dot_size+1)-self._height)
-            dx1, dx2 = max(0, dot_size-x), dot_size*2+1 - max(0, (x+dot_size+1)-self._width)
-            
-            if self._colour:
-                # Make dots pure white (255 for all channels)
-                white_dot = np.full((dot[dy1:dy2, dx1:dx2].shape[0], 
-                                   dot[dy1:dy2, dx1:dx2].shape[0], 3), 255, dtype=np.uint8)
-                mask = dot[dy1:dy2, dx1:dx2] > 0
-                frame[y1:y2, x1:x2][mask] = white_dot[mask]
-            else:
-                frame[y1:y2, x1:x2] = dot[dy1:dy2, dx1:dx2]
+            base = np.zeros((self._height, self._width), dtype=np.uint8)
+            white = 255
         
+        dot_radius = 6  # Large dots for better visibility
+        for x, y in self._patterns[camera_index].positions:
+            cv2.circle(base, (x, y), dot_radius, white, -1)
+        return base
+
+    def _generate_frame(self, camera_index: int) -> Tuple[np.ndarray, float]:
+        """
+        Generate a single synthetic frame with bright white dots.
+        
+        The dots are static, so the pattern is rendered once and each frame
+        only applies exposure and gain into a per-camera output buffer. The
+        returned array is reused by the next read of the same camera.
+        """
         # Apply exposure and gain with higher base brightness
-        frame = frame * (self._gain[camera_index]/16) * (self._exposure[camera_index]/64)
-        frame = np.clip(frame, 0, 255).astype(np.uint8)
+        scale = (self._gain[camera_index]/16) * (self._exposure[camera_index]/64)
+        cv2.convertScaleAbs(self._base_frames[camera_index], dst=self._frames[camera_index], alpha=scale)
         
-        return frame, time.time()
+        return self._frames[camera_index], time.time()
     
     @property
     def exposure(self) -> List[int]:
@@ -0,0 +1,287 @@
+import threading
+import time
+
+import numpy as np
+
+
+class StateHistory:
+    """
+    Fixed-size ring buffer of timestamped states for one marker or body.
+
+    Timestamps are kept in increasing order, so a lookup is a binary search
+    over the buffer. Appends and lookups write into preallocated arrays and
+    do not allocate new ones.
+    """
+
+    def __init__(self, capacity=256, width=3, quaternion_start=None):
+        """
+        Args:
+            capacity: Number of samples kept
+            width: Size of one state vector
+            quaternion_start: Index where a unit quaternion (x, y, z, w) starts
+                in the state, or None if the state has no orientation
+        """
+        self.capacity = capacity
+        self.width = width
+        self.times = np.zeros(capacity)
+        self.states = np.zeros((capacity, width))
+        self.quaternion = slice(quaternion_start, quaternion_start + 4) if quaternion_start is not None else None
+        self._start = 0
+        self._count = 0
+
+    def clear(self):
+        self._start = 0
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def last_time(self):
+        if self._count == 0:
+            return None
+        return self.times[(self._start + self._count - 1) % self.capacity]
+
+    def append(self, timestamp, state):
+        """Add a sample; samples older than the newest one are ignored."""
+        if self._count and timestamp <= self.last_time:
+            return False
+        if self._count < self.capacity:
+            index = (self._start + self._count) % self.capacity
+            self._count += 1
+        else:
+            index = self._start
+            self._start = (self._start + 1) % self.capacity
+        self.times[index] = timestamp
+        self.states[index] = state
+        return True
+
+    def sample(self, timestamp, out, max_extrapolation=0.1):
+        """
+        Estimate the state at timestamp.
+
+        Between samples the state is interpolated; after the newest sample it
+        is extrapolated at constant velocity for at most max_extrapolation
+        seconds; at the newest sample, or within the horizon when there is no
+        velocity to predict with, the newest state is held; before the oldest
+        sample the oldest state is returned. Further than max_extrapolation
+        past the newest sample the state stops at the horizon and is reported
+        as 'stale'.
+
+        Args:
+            timestamp: Time to estimate the state at
+            out: Array of size width receiving the state
+            max_extrapolation: Longest prediction horizon in seconds
+
+        Returns:
+            'interpolated', 'extrapolated', 'stale', 'held' or 'clamped', or None if empty
+        """
+        count = self._count
+        if count == 0:
+            return None
+        capacity, start, times = self.capacity, self._start, self.times
+        last = (start + count - 1) % capacity
+
+        if timestamp <= times[start]:
+            out[:] = self.states[start]
+            return 'clamped'
+
+        if timestamp >= times[last]:
+            ahead = timestamp - times[last]
+            # Past the horizon the prediction stops; say so rather than pass it off as current
+            stale = ahead > max(max_extrapolation, 0.0)
+            horizon = min(ahead, max_extrapolation)
+            if count < 2 or horizon <= 0:
+                out[:] = self.states[last]
+                return 'stale' if stale else 'held'
+            previous = (last - 1) % capacity
+            alpha = 1.0 + horizon / (times[last] - times[previous])
+            self._blend(previous, last, alpha, out)
+            return 'stale' if stale else 'extrapolated'
+
+        # Binary search over logical positions: times[lo] <= timestamp < times[hi]
+        lo, hi = 0, count - 1
+        while hi - lo > 1:
+            mid = (lo + hi) // 2
+            if times[(start + mid) % capacity] <= timestamp:
+                lo = mid
+            else:
+                hi = mid
+        i0, i1 = (start + lo) % capacity, (start + hi) % capacity
+        alpha = (timestamp - times[i0]) / (times[i1] - times[i0])
+        self._blend(i0, i1, alpha, out)
+        return 'interpolated'
+
+    def _blend(self, i0, i1, alpha, out):
+        """out = a + alpha * (b - a), renormalising the quaternion part."""
+        a, b = self.states[i0], self.states[i1]
+        np.subtract(b, a, out=out)
+        out *= alpha
+        out += a
+        q = self.quaternion
+        if q is not None:
+            qa, qb, qo = a[q], b[q], out[q]
+            if np.dot(qa, qb) < 0:
+                # Take the short way round: blend towards -qb instead
+                np.add(qb, qa, out=qo)
+                qo *= -alpha
+                qo += qa
+            qo /= np.linalg.norm(qo)
+
+
+class LatencyEstimator:
+    """
+    Per-camera latency bookkeeping.
+
+    capture_offset is the configured time between the middle of the exposure
+    and the moment the driver timestamps the frame (exposure and USB
+    transfer). It is not measured; it defaults to half a frame period and is
+    the only correction scene_time applies. The processing delay between the
+    capture timestamp and the frame reaching the pipeline is measured and
+    smoothed with an exponential moving average, but only reported: it says
+    how stale frames are on arrival, not when the scene was imaged.
+    """
+
+    def __init__(self, num_cameras, fps=30, capture_offset=None, smoothing=0.05):
+        """
+        Args:
+            num_cameras: Number of cameras
+            fps: Camera frame rate, used for the default capture offset
+            capture_offset: Seconds between mid-exposure and the capture
+                timestamp, for every camera; defaults to half a frame period
+            smoothing: Weight of each new measurement in the moving average
+        """
+        default_offset = 0.5 / fps if capture_offset is None else capture_offset
+        self.capture_offset = np.full(num_cameras, default_offset)
+        self.processing_delay = np.zeros(num_cameras)
+        self.samples = np.zeros(num_cameras, dtype=np.int64)
+        self.smoothing = smoothing
+
+    def record(self, camera_index, timestamp, arrival=None):
+        """Record the arrival of a frame captured at timestamp."""
+        delay = (time.time() if arrival is None else arrival) - timestamp
+        if self.samples[camera_index] == 0:
+            self.processing_delay[camera_index] = delay
+        else:
+            self.processing_delay[camera_index] += self.smoothing * (delay - self.processing_delay[camera_index])
+        self.samples[camera_index] += 1
+
+    def scene_time(self, timestamp, cameras=None):
+        """
+        Correct a capture timestamp to the time the scene was imaged.
+
+        Args:
+            timestamp: Capture timestamp
+            cameras: Indices of the cameras whose frames produced the data;
+                all cameras if None
+        """
+        if cameras is None or len(cameras) == 0:
+            offsets = self.capture_offset
+        else:
+            offsets = self.capture_offset[list(cameras)]
+        return timestamp - float(np.mean(offsets))
+
+    def summary(self):
+        return [
+            {
+                'camera': i + 1,
+                'capture_offset': float(self.capture_offset[i]),
+                'processing_delay': float(self.processing_delay[i]),
+                'total_latency': float(self.capture_offset[i] + self.processing_delay[i]),
+                'samples': int(self.samples[i])
+            }
+            for i in range(len(self.capture_offset))
+        ]
+
+
+class PoseHistory:
+    """
+    Timestamped history of every tracked marker and body.
+
+    Histories come from a pool allocated up front and are recycled when a
+    track has not been seen for expiry seconds, so recording and lookups do
+    not allocate in steady state.
+    """
+
+    def __init__(self, max_markers=256, max_bodies=8, capacity=256, expiry=1.0):
+        self.expiry = expiry
+        self._lock = threading.Lock()
+        self._free_markers = [StateHistory(capacity, 3) for _ in range(max_markers)]
+        self._free_bodies = [StateHistory(capacity, 7, quaternion_start=3) for _ in range(max_bodies)]
+        self._markers = {}  # track id -> StateHistory
+        self._bodies = {}   # body id -> StateHistory
+        self._marker_out = np.zeros(3)
+        self._body_out = np.zeros(7)
+        self._body_state = np.zeros(7)
+        self.latest_time = None
+
+    def record(self, timestamp, track_ids, positions, bodies=()):
+        """
+        Add one frame of tracking output.
+
+        Args:
+            timestamp: Scene time of the frame
+            track_ids: (N,) track ids
+            positions: (N, 3) marker positions
+            bodies: Iterable of (body_id, position, quaternion)
+        """
+        with self._lock:
+            self.latest_time = timestamp
+            for track_id, position in zip(track_ids, positions):
+                history = self._history(self._markers, self._free_markers, int(track_id))
+                if history is not None:
+                    history.append(timestamp, position)
+            for body_id, position, quaternion in bodies:
+                history = self._history(self._bodies, self._free_bodies, int(body_id))
+                if history is not None:
+                    self._body_state[:3] = position
+                    self._body_state[3:] = quaternion
+                    history.append(timestamp, self._body_state)
+            self._expire(self._markers, self._free_markers, timestamp)
+            self._expire(self._bodies, self._free_bodies, timestamp)
+
+    def clear(self):
+        """Forget every marker and body, e.g. when the world frame changes."""
+        with self._lock:
+            for active, free in ((self._markers, self._free_markers), (self._bodies, self._free_bodies)):
+                free.extend(active.values())
+                active.clear()
+            self.latest_time = None
+
+    @staticmethod
+    def _history(active, free, key):
+        history = active.get(key)
+        if history is None and free:
+            history = free.pop()
+            history.clear()
+            active[key] = history
+        return history
+
+    def _expire(self, active, free, now):
+        stale = [key for key, history in active.items() if now - history.last_time > self.expiry]
+        for key in stale:
+            free.append(active.pop(key))
+
+    def query(self, timestamp, max_extrapolation=0.1):
+        """
+        Marker and body states at timestamp.
+
+        Returns:
+            dict with 'markers' and 'bodies' lists ready to be sent as JSON
+        """
+        markers, bodies = [], []
+        with self._lock:
+            for track_id, history in self._markers.items():
+                status = history.sample(timestamp, self._marker_out, max_extrapolation)
+                if status is not None:
+                    markers.append({'id': track_id, 'position': self._marker_out.tolist(), 'status': status})
+            for body_id, history in self._bodies.items():
+                status = history.sample(timestamp, self._body_out, max_extrapolation)
+                if status is not None:
+                    bodies.append({
+                        'id': body_id,
+                        'position': self._body_out[:3].tolist(),
+                        'quaternion': self._body_out[3:].tolist(),
+                        'status': status
+                    })
+        return {'markers': markers, 'bodies': bodies}
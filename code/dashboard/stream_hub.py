@@ -0,0 +1,238 @@
+import asyncio
+import concurrent.futures
+import threading
+import time
+
+
+FRAME_BOUNDARY = b'--frame\r\nContent-Type: image/jpeg\r\n\r\n'
+
+
+def put_latest(queue, item):
+    """Put item on a bounded queue, dropping the oldest entry if it is full."""
+    while True:
+        try:
+            queue.put_nowait(item)
+            return
+        except asyncio.QueueFull:
+            try:
+                queue.get_nowait()
+            except asyncio.QueueEmpty:
+                pass
+
+
+class StreamHub:
+    """
+    Serves camera streams and data feeds from a single asyncio event loop.
+
+    The loop runs in its own thread. Each camera has one producer that
+    captures frames and runs dot detection whenever the cameras stream, so
+    marker reconstruction and the data feeds work without anyone watching
+    the video. Frames are only JPEG-encoded while a camera has viewers, and
+    the cost does not grow with their number. Every viewer reads from a
+    bounded queue that only ever holds the newest frame, so a slow client
+    skips frames instead of stalling the producer or piling up memory.
+    Data feeds follow the same pattern: a producer fills a latest-only queue
+    and a sender drains it.
+    """
+
+    def __init__(self, camera_manager, max_viewers=32, max_fps=30, placeholder_interval=0.5,
+                 viewer_timeout=1.0):
+        """
+        Args:
+            camera_manager: CameraManager producing the frames
+            max_viewers: Maximum number of concurrent video viewers across all cameras
+            max_fps: Upper bound on the capture rate of each camera producer
+            placeholder_interval: Seconds between frames while cameras are not streaming
+            viewer_timeout: How long a viewer waits for a frame before re-checking shutdown
+        """
+        self.camera_manager = camera_manager
+        self.max_viewers = max_viewers
+        self.min_frame_interval = 1.0 / max_fps
+        self.placeholder_interval = placeholder_interval
+        self.viewer_timeout = viewer_timeout
+
+        self.loop = None
+        self._thread = None
+        self._closing = False
+        self._viewers = {}     # camera index -> set of viewer queues
+        self._producers = []   # one capture task per camera
+        self._feed_tasks = []
+        self._viewer_lock = threading.Lock()
+
+        # Blocking camera reads and feed work run here, off the event loop
+        self._capture_executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max(camera_manager.num_cameras, 1), thread_name_prefix='capture')
+        self._feed_executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=4, thread_name_prefix='feed')
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run_loop, daemon=True)
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._start_producers(), self.loop).result()
+
+    async def _start_producers(self):
+        self._producers = [asyncio.create_task(self._produce_frames(camera_index))
+                           for camera_index in range(self.camera_manager.num_cameras)]
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    @property
+    def viewer_count(self):
+        return sum(len(queues) for queues in self._viewers.values())
+
+    # Video streams
+
+    def open_viewer(self, camera_index):
+        """
+        Register a viewer for one camera.
+
+        Returns:
+            A queue to pass to iter_frames, or None if the viewer cap is reached
+        """
+        with self._viewer_lock:
+            if self._closing or self.viewer_count >= self.max_viewers:
+                return None
+            future = asyncio.run_coroutine_threadsafe(self._add_viewer(camera_index), self.loop)
+            return future.result()
+
+    async def _add_viewer(self, camera_index):
+        queue = asyncio.Queue(maxsize=1)
+        self._viewers.setdefault(camera_index, set()).add(queue)
+        return queue
+
+    def close_viewer(self, camera_index, queue):
+        if self.loop is not None and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self._viewers.get(camera_index, set()).discard, queue)
+
+    def iter_frames(self, camera_index, queue):
+        """
+        Multipart JPEG chunks for a Flask Response.
+
+        Runs in the request's worker thread and waits on the viewer's queue
+        through the event loop.
+        """
+        try:
+            while not self._closing:
+                future = asyncio.run_coroutine_threadsafe(queue.get(), self.loop)
+                try:
+                    chunk = future.result(timeout=self.viewer_timeout)
+                except concurrent.futures.TimeoutError:
+                    # The get may have finished just as the wait timed out
+                    if future.cancel():
+                        continue
+                    chunk = future.result()
+                if chunk is None:
+                    break
+                yield chunk
+        finally:
+            self.close_viewer(camera_index, queue)
+
+    def _capture(self, camera_index, watched):
+        """
+        Capture and detect one frame; encode it only if someone is watching.
+
+        Returns:
+            (captured, jpeg) with jpeg None when there are no viewers
+        """
+        cm = self.camera_manager
+        frame = cm.capture_frame(camera_index, draw=watched)
+        if not watched:
+            return frame is not None, None
+        if frame is None:
+            return False, cm.get_placeholder_frame(camera_index)
+        return True, cm.encode_frame(frame)
+
+    async def _produce_frames(self, camera_index):
+        """Capture frames for one camera and hand the JPEGs to its viewers."""
+        loop = asyncio.get_running_loop()
+        while True:
+            started = time.monotonic()
+            watched = bool(self._viewers.get(camera_index))
+            try:
+                captured, frame_bytes = await loop.run_in_executor(
+                    self._capture_executor, self._capture, camera_index, watched)
+            except Exception as e:
+                print(f"Error capturing camera {camera_index + 1}: {str(e)}")
+                await asyncio.sleep(self.placeholder_interval)
+                continue
+
+            if frame_bytes is not None:
+                # Build the multipart chunk once and share it between viewers; the
+                # WSGI server needs bytes, so this is the one copy of the JPEG
+                chunk = b''.join((FRAME_BOUNDARY, frame_bytes, b'\r\n'))
+                for queue in list(self._viewers.get(camera_index, ())):
+                    put_latest(queue, chunk)
+
+            interval = self.min_frame_interval if captured else self.placeholder_interval
+            await asyncio.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+    # Data feeds
+
+    def add_feed(self, produce, send, interval):
+        """
+        Run a data feed on the event loop.
+
+        Args:
+            produce: Callable returning the next payload, or None to skip
+            send: Callable delivering a payload to clients
+            interval: Seconds between calls to produce
+        """
+        asyncio.run_coroutine_threadsafe(self._start_feed(produce, send, interval), self.loop).result()
+
+    async def _start_feed(self, produce, send, interval):
+        queue = asyncio.Queue(maxsize=1)
+        self._feed_tasks.append(asyncio.create_task(self._run_feed_producer(produce, queue, interval)))
+        self._feed_tasks.append(asyncio.create_task(self._run_feed_sender(send, queue)))
+
+    async def _run_feed_producer(self, produce, queue, interval):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = time.monotonic()
+            try:
+                payload = await loop.run_in_executor(self._feed_executor, produce)
+                if payload is not None:
+                    put_latest(queue, payload)
+            except Exception as e:
+                print(f"Error producing feed data: {str(e)}")
+            await asyncio.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+    async def _run_feed_sender(self, send, queue):
+        loop = asyncio.get_running_loop()
+        while True:
+            payload = await queue.get()
+            try:
+                await loop.run_in_executor(self._feed_executor, send, payload)
+            except Exception as e:
+                print(f"Error sending feed data: {str(e)}")
+
+    # Shutdown
+
+    def shutdown(self, timeout=5.0):
+        """Stop producers, release viewers, then close the cameras."""
+        self._closing = True
+        if self.loop is not None and self.loop.is_running():
+            try:
+                asyncio.run_coroutine_threadsafe(self._stop(), self.loop).result(timeout)
+            except Exception as e:
+                print(f"Error stopping stream hub: {str(e)}")
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join(timeout)
+        self._capture_executor.shutdown(wait=True, cancel_futures=True)
+        self._feed_executor.shutdown(wait=True, cancel_futures=True)
+        self.camera_manager.close_cameras()
+
+    async def _stop(self):
+        tasks = self._producers + self._feed_tasks
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # Wake every viewer so its generator returns
+        for queues in self._viewers.values():
+            for queue in queues:
+                put_latest(queue, None)
+        self._viewers.clear()
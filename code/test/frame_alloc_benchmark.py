@@ -0,0 +1,68 @@
+import os
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dashboard'))
+
+from camera_manager import CameraManager
+from mock_camera import MockCamera
+
+
+# Measures memory allocated per frame on the streaming path with mock cameras.
+# Run from the repository root: python code/test/frame_alloc_benchmark.py
+
+WARMUP_FRAMES = 50
+MEASURED_FRAMES = 300
+
+
+def legacy_frame(camera_manager, camera_index):
+    """The frame path before buffer reuse, for comparison."""
+    frame, timestamp = camera_manager.cameras.read(camera_index)
+    frame_bgr = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
+    frame_bgr = camera_manager.process_frame(frame_bgr, camera_index, timestamp)
+    ret, buffer = cv2.imencode('.jpg', frame_bgr)
+    return buffer.tobytes()
+
+
+def measure(name, get_frame, num_cameras):
+    for i in range(WARMUP_FRAMES):
+        get_frame(i % num_cameras)
+
+    tracemalloc.start()
+    transient = []
+    retained_start = tracemalloc.get_traced_memory()[0]
+    started = time.perf_counter()
+    for i in range(MEASURED_FRAMES):
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        get_frame(i % num_cameras)
+        # Peak above the starting point is what this frame allocated
+        transient.append(tracemalloc.get_traced_memory()[1] - before)
+    elapsed = time.perf_counter() - started
+    retained = tracemalloc.get_traced_memory()[0] - retained_start
+    tracemalloc.stop()
+
+    transient = np.array(transient)
+    print(f"{name}:")
+    print(f"  allocated per frame: median {np.median(transient) / 1024:.1f} KiB, "
+          f"max {transient.max() / 1024:.1f} KiB")
+    print(f"  retained after {MEASURED_FRAMES} frames: {retained / 1024:.1f} KiB")
+    print(f"  time per frame (with tracing): {elapsed / MEASURED_FRAMES * 1000:.2f} ms")
+
+
+if __name__ == '__main__':
+    camera_manager = CameraManager()
+    camera_manager.cameras = MockCamera([0, 1, 2], fps=[30, 30, 30], resolution="large",
+                                        colour=True, config="plane")
+    camera_manager.resolutions = [(640, 480)] * camera_manager.num_cameras
+    camera_manager.streaming = True
+    camera_manager.detect_dots = True
+
+    frame_bytes = 640 * 480 * 3
+    print(f"One BGR frame is {frame_bytes / 1024:.1f} KiB\n")
+    measure("Legacy path", lambda i: legacy_frame(camera_manager, i), camera_manager.num_cameras)
+    measure("Buffered path", camera_manager.get_frame, camera_manager.num_cameras)
@@ -0,0 +1,145 @@
+import os
+import sys
+import threading
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dashboard'))
+
+from calibration_monitor import CalibrationMonitor
+from calibration_store import CalibrationStore
+
+
+class FakeCameraManager:
+    num_cameras = 3
+
+    def __init__(self, store):
+        self.calibration_store = store
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = CalibrationStore(str(tmp_path / 'camera_params.json'))
+    store.save([[0, 0, 0]] * 3)
+    return store
+
+
+def make_monitor(store, alerts, **kwargs):
+    monitor = CalibrationMonitor(FakeCameraManager(store), on_alert=alerts.append, **kwargs)
+    monitor._version = store.version
+    monitor._restore_reference(store.version)
+    return monitor
+
+
+def feed(monitor, errors, samples):
+    for _ in range(samples):
+        monitor.record_errors(dict(enumerate(errors)))
+
+
+@pytest.mark.parametrize('degraded, drifting', [
+    ([False, False], [False, False, False]),
+    ([True, False], [True, False, False]),    # only pair 1-2: its end camera
+    ([False, True], [False, False, True]),    # only pair 2-3: camera 3
+    ([True, True], [False, True, False]),     # both pairs: the shared camera
+])
+def test_attribute(store, degraded, drifting):
+    monitor = make_monitor(store, [])
+    result, _ = monitor._attribute(np.array(degraded), np.array([3.0, 3.0]))
+    assert result.tolist() == drifting
+
+
+def test_steady_error_after_calibration_does_not_alert(store):
+    alerts = []
+    monitor = make_monitor(store, alerts)
+    # Imperfect but unchanged calibration, above the threshold in absolute terms
+    feed(monitor, [1.3, 3.7], 80)
+
+    assert alerts == []
+    health = monitor.get_health()
+    assert [p['reference_px'] for p in health['pairs']] == pytest.approx([1.3, 3.7])
+    assert not any(p['degraded'] for p in health['pairs'])
+
+
+def test_rise_over_reference_alerts_the_bumped_camera(store):
+    alerts = []
+    monitor = make_monitor(store, alerts)
+    feed(monitor, [1.3, 3.7], 20)
+    feed(monitor, [1.4, 7.0], 20)
+
+    assert [alert['camera'] for alert in alerts] == [3]
+    assert alerts[0]['increase_px'] == pytest.approx(3.3)
+    assert alerts[0]['reference_px'] == pytest.approx(3.7)
+
+
+def test_reference_survives_a_restart(store):
+    feed(make_monitor(store, []), [1.3, 3.7], 20)
+    assert store.reference_errors(store.version) == pytest.approx({'1-2': 1.3, '2-3': 3.7})
+
+    # Camera 3 was bumped while the server was down
+    alerts = []
+    restarted_store = CalibrationStore(store.config_path)
+    restarted_store.load()
+    restarted = make_monitor(restarted_store, alerts)
+    feed(restarted, [1.3, 7.0], 20)
+
+    assert [alert['camera'] for alert in alerts] == [3]
+
+
+def test_new_version_learns_its_own_reference(store):
+    feed(make_monitor(store, []), [1.3, 3.7], 20)
+    store.save([[0, 0, 0]] * 3)
+
+    monitor = make_monitor(store, [])
+    assert monitor.get_health()['pairs'][0]['reference_px'] is None
+    feed(monitor, [0.8, 0.9], 20)
+    assert store.reference_errors(store.version) == pytest.approx({'1-2': 0.8, '2-3': 0.9})
+
+
+def test_refinement_waits_for_new_correspondences(store):
+    monitor = make_monitor(store, [], refine=True)
+    attempts = []
+    done = threading.Event()
+
+    def refine_pair(pair):
+        attempts.append(pair[:2])
+        monitor._refine_lock.release()
+        done.set()
+
+    monitor._refine_pair = refine_pair
+    rng = np.random.default_rng(0)
+
+    def add_correspondences(count):
+        points = rng.uniform(0, 480, (count, 2, 2))
+        monitor._store_correspondences((1, 2), points[:, 0], points[:, 1])
+
+    def degrade(expect_attempt=True):
+        done.clear()
+        feed(monitor, [1.3, 9.0], 1)
+        done.wait(1.0 if expect_attempt else 0.05)
+
+    add_correspondences(20)
+    feed(monitor, [1.3, 3.7], 20)
+    feed(monitor, [1.3, 9.0], 19)
+    degrade()
+    assert attempts == [(1, 2)]
+
+    # Still degraded, but nothing new to fit on
+    for _ in range(5):
+        degrade(expect_attempt=False)
+    assert attempts == [(1, 2)]
+
+    add_correspondences(monitor.retry_correspondences)
+    degrade()
+    assert attempts == [(1, 2), (1, 2)]
+
+
+def test_static_markers_are_not_enough_to_refine(store):
+    monitor = make_monitor(store, [])
+    # The same three markers seen frame after frame
+    markers = np.array([[[100, 100], [110, 105]], [[300, 200], [290, 210]], [[200, 400], [205, 395]]], float)
+    corr = np.tile(markers, (60, 1, 1))
+
+    distinct = monitor._distinct(corr)
+    assert len(distinct) == 3
+    assert not monitor._well_spread(distinct)
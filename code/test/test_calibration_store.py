@@ -0,0 +1,227 @@
+import json
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dashboard'))
+
+from calibration_store import CalibrationStore, POSITION_SCALE, cameras_from_chain
+from camera_manager import CameraManager
+
+
+RESOLUTIONS = [(640, 480)] * 3
+
+
+def rotation(axis, angle):
+    """Rotation matrix about axis by angle (radians)."""
+    axis = np.asarray(axis, dtype=np.float64)
+    axis = axis / np.linalg.norm(axis)
+    K = np.array([[0, -axis[2], axis[1]], [axis[2], 0, -axis[0]], [-axis[1], axis[0], 0]])
+    return np.eye(3) + np.sin(angle) * K + (1 - np.cos(angle)) * K @ K
+
+
+def chain(seed=0):
+    """Chained extrinsics and the camera positions CameraManager derives from them."""
+    rng = np.random.default_rng(seed)
+    R12 = rotation(rng.normal(size=3), 0.6)
+    R23 = rotation(rng.normal(size=3), 0.5)
+    t12 = rng.normal(size=3)
+    t23 = rng.normal(size=3)
+    camera1 = np.array([1.5, 1.0, -1.0])
+    camera2 = camera1 + POSITION_SCALE * t12
+    camera3 = camera2 + POSITION_SCALE * (R12 @ t23)
+    extrinsics = {'R12': R12, 't12': t12, 'R23': R23, 't23': t23}
+    return extrinsics, [camera1.tolist(), camera2.tolist(), camera3.tolist()]
+
+
+def save(store, seed):
+    extrinsics, positions = chain(seed)
+    cameras = cameras_from_chain(positions[0], [(extrinsics['R12'], extrinsics['t12']),
+                                                (extrinsics['R23'], extrinsics['t23'])], RESOLUTIONS)
+    return store.save(positions, cameras, extrinsics)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return CalibrationStore(str(tmp_path / 'config' / 'camera_params.json'))
+
+
+def test_save_creates_increasing_versions_with_history(store):
+    first = save(store, 0)
+    second = save(store, 1)
+
+    assert (first.version, second.version) == (1, 2)
+    assert store.snapshot is second
+    assert store.versions() == [1, 2]
+    with open(store.config_path) as f:
+        assert json.load(f)['version'] == 2
+
+
+def test_history_is_pruned_to_keep_versions(tmp_path):
+    store = CalibrationStore(str(tmp_path / 'camera_params.json'), keep_versions=3)
+    for seed in range(5):
+        save(store, seed)
+
+    assert store.versions() == [3, 4, 5]
+    with pytest.raises(KeyError):
+        CalibrationStore(store.config_path).get(1)
+
+
+def test_reload_reads_current_version(store):
+    saved = save(store, 0)
+    save(store, 1)
+
+    reloaded = CalibrationStore(store.config_path)
+    current = reloaded.load()
+    assert current.version == 2
+    # Older versions come back from the history directory
+    old = reloaded.get(1)
+    assert old.camera_positions == saved.camera_positions
+    np.testing.assert_allclose(old.projection(2), saved.projection(2))
+
+
+def test_snapshot_is_read_only(store):
+    snapshot = save(store, 0)
+    with pytest.raises(ValueError):
+        snapshot.projection(0)[0, 0] = 1.0
+
+
+def test_legacy_config_is_converted_from_chained_extrinsics(tmp_path):
+    extrinsics, positions = chain(3)
+    config_path = tmp_path / 'camera_params.json'
+    calibration_data = {name: value.tolist() for name, value in extrinsics.items()}
+    calibration_data['timestamp'] = '2024-01-01T00:00:00'
+    config_path.write_text(json.dumps({'camera_positions': positions, 'calibration_data': calibration_data}))
+
+    snapshot = CalibrationStore(str(config_path)).load()
+
+    assert snapshot.version == 1
+    assert snapshot.is_calibrated
+    # Camera centres agree with the positions the dashboard shows
+    np.testing.assert_allclose(snapshot.centers, positions, atol=1e-9)
+
+    # Points seen by both cameras of a pair satisfy the epipolar constraint
+    rng = np.random.default_rng(0)
+    points = np.c_[rng.normal(size=(20, 3)) + snapshot.center(0) + [0, 0, 5], np.ones(20)]
+    for a, b in snapshot.pairs:
+        x_a = points @ snapshot.projection(a).T
+        x_b = points @ snapshot.projection(b).T
+        x_a /= x_a[:, 2:]
+        x_b /= x_b[:, 2:]
+        residuals = np.einsum('ij,jk,ik->i', x_b, snapshot.fundamental(a, b), x_a)
+        np.testing.assert_allclose(residuals, 0, atol=1e-9)
+
+
+def test_loaded_version_is_archived_and_survives_a_later_save(tmp_path):
+    extrinsics, positions = chain(3)
+    config_path = tmp_path / 'camera_params.json'
+    calibration_data = {name: value.tolist() for name, value in extrinsics.items()}
+    config_path.write_text(json.dumps({'camera_positions': positions, 'calibration_data': calibration_data}))
+
+    store = CalibrationStore(str(config_path))
+    loaded = store.load()
+    assert store.versions() == [1]
+    save(store, 4)
+
+    # A restart only sees the history directory
+    restarted = CalibrationStore(str(config_path))
+    restarted.load()
+    assert restarted.versions() == [1, 2]
+    restored = restarted.rollback(1)
+    assert restored.version == 3
+    np.testing.assert_allclose(restored.centers, loaded.centers)
+
+
+def test_config_without_extrinsics_is_uncalibrated(tmp_path):
+    config_path = tmp_path / 'camera_params.json'
+    config_path.write_text(json.dumps({'camera_positions': [[0, 0, 0]] * 3, 'calibration_data': {}}))
+
+    snapshot = CalibrationStore(str(config_path)).load()
+    assert not snapshot.is_calibrated
+    assert snapshot.camera_positions == ((0, 0, 0),) * 3
+
+
+def test_rollback_saves_old_calibration_as_new_version(store):
+    first = save(store, 0)
+    save(store, 1)
+
+    restored = store.rollback(1)
+
+    assert restored.version == 3
+    assert store.snapshot is restored
+    assert restored.camera_positions == first.camera_positions
+    np.testing.assert_allclose(restored.pair_extrinsics['R12'], first.pair_extrinsics['R12'])
+    np.testing.assert_allclose(restored.fundamental(0, 1), first.fundamental(0, 1))
+    assert store.versions() == [1, 2, 3]
+
+
+def test_rollback_to_unknown_version_fails(store):
+    save(store, 0)
+    with pytest.raises(KeyError):
+        store.rollback(7)
+    assert store.version == 1
+
+
+def test_camera_manager_rollback_reloads_manager_state(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    camera_manager = CameraManager()
+    camera_manager.resolutions = RESOLUTIONS
+
+    first_extrinsics, first_positions = chain(0)
+    for seed in (0, 1):
+        extrinsics, positions = chain(seed)
+        camera_manager.camera_positions = positions
+        for name, value in extrinsics.items():
+            setattr(camera_manager, name, value)
+        assert camera_manager.save_camera_config()
+
+    success, message = camera_manager.rollback_calibration(1)
+
+    assert success, message
+    assert camera_manager.calibration_store.version == 3
+    np.testing.assert_allclose(camera_manager.camera_positions, first_positions)
+    for name, value in first_extrinsics.items():
+        np.testing.assert_allclose(getattr(camera_manager, name), value)
+
+    # A later save, e.g. from refinement, keeps the restored calibration
+    assert camera_manager.save_camera_config()
+    current = camera_manager.calibration_store.snapshot
+    assert current.version == 4
+    np.testing.assert_allclose(current.camera_positions, first_positions)
+    np.testing.assert_allclose(current.pair_extrinsics['t23'], first_extrinsics['t23'])
+
+
+def test_camera_manager_can_roll_back_to_version_loaded_at_startup(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    extrinsics, positions = chain(5)
+    config_dir = tmp_path / 'code' / 'dashboard' / 'config'
+    config_dir.mkdir(parents=True)
+    calibration_data = {name: value.tolist() for name, value in extrinsics.items()}
+    (config_dir / 'camera_params.json').write_text(
+        json.dumps({'camera_positions': positions, 'calibration_data': calibration_data}))
+
+    camera_manager = CameraManager()
+    camera_manager.resolutions = RESOLUTIONS
+    new_extrinsics, camera_manager.camera_positions = chain(6)
+    for name, value in new_extrinsics.items():
+        setattr(camera_manager, name, value)
+    assert camera_manager.save_camera_config()
+
+    restarted = CameraManager()
+    assert restarted.calibration_store.versions() == [1, 2]
+    success, message = restarted.rollback_calibration(1)
+    assert success, message
+    np.testing.assert_allclose(restarted.camera_positions, positions)
+    np.testing.assert_allclose(restarted.R23, extrinsics['R23'])
+
+
+def test_camera_manager_rollback_to_unknown_version(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    camera_manager = CameraManager()
+
+    success, message = camera_manager.rollback_calibration(5)
+
+    assert not success
+    assert 'version 5' in message
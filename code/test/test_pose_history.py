@@ -0,0 +1,158 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dashboard'))
+
+from pose_history import PoseHistory, StateHistory
+
+
+def quaternion(axis, angle):
+    """Unit quaternion (x, y, z, w) for a rotation about axis by angle."""
+    axis = np.asarray(axis, dtype=np.float64)
+    axis = axis / np.linalg.norm(axis)
+    return np.append(np.sin(angle / 2) * axis, np.cos(angle / 2))
+
+
+def filled(capacity, times, width=3):
+    """History where the state at time t is (t, 2t, 3t)."""
+    history = StateHistory(capacity, width)
+    for t in times:
+        history.append(t, [t, 2 * t, 3 * t])
+    return history
+
+
+def test_interpolates_across_the_ring_wrap():
+    # Ten samples through a buffer of four: the oldest kept sample is not at index 0
+    history = filled(4, range(10))
+    assert len(history) == 4
+    assert history._start != 0
+
+    out = np.zeros(3)
+    for t in (6.25, 7.5, 8.9):
+        assert history.sample(t, out) == 'interpolated'
+        np.testing.assert_allclose(out, [t, 2 * t, 3 * t])
+
+
+def test_interpolates_between_every_pair_of_a_wrapped_buffer():
+    history = filled(5, np.arange(12) * 0.1)
+    out = np.zeros(3)
+    for t in np.linspace(0.71, 1.09, 20):
+        assert history.sample(t, out) == 'interpolated'
+        np.testing.assert_allclose(out, [t, 2 * t, 3 * t])
+
+
+def test_clamped_before_the_oldest_sample():
+    history = filled(4, range(10))
+    out = np.zeros(3)
+    assert history.sample(2.0, out) == 'clamped'
+    np.testing.assert_allclose(out, [6, 12, 18])
+
+
+def test_out_of_order_samples_are_ignored():
+    history = filled(4, [1.0, 2.0])
+    assert not history.append(1.5, [0, 0, 0])
+    assert len(history) == 2
+
+
+def test_held_at_the_newest_sample():
+    history = filled(4, [1.0, 2.0])
+    out = np.zeros(3)
+    assert history.sample(2.0, out) == 'held'
+    np.testing.assert_allclose(out, [2, 4, 6])
+
+
+def test_single_sample_is_held_within_the_horizon():
+    history = filled(4, [1.0])
+    out = np.zeros(3)
+    assert history.sample(1.05, out, max_extrapolation=0.1) == 'held'
+    np.testing.assert_allclose(out, [1, 2, 3])
+
+
+@pytest.mark.parametrize('horizon', [0.0, -1.0])
+def test_zero_or_negative_horizon_does_not_predict(horizon):
+    history = filled(4, [1.0, 2.0])
+    out = np.zeros(3)
+    assert history.sample(2.3, out, max_extrapolation=horizon) == 'stale'
+    np.testing.assert_allclose(out, [2, 4, 6])
+
+
+def test_extrapolates_within_the_horizon():
+    history = filled(4, [1.0, 2.0])
+    out = np.zeros(3)
+    assert history.sample(2.25, out, max_extrapolation=0.5) == 'extrapolated'
+    np.testing.assert_allclose(out, [2.25, 4.5, 6.75])
+
+
+def test_prediction_stops_at_the_horizon_and_is_stale():
+    history = filled(4, [1.0, 2.0])
+    out = np.zeros(3)
+    assert history.sample(8.0, out, max_extrapolation=0.5) == 'stale'
+    np.testing.assert_allclose(out, [2.5, 5.0, 7.5])
+
+
+def test_empty_history():
+    assert StateHistory(4).sample(1.0, np.zeros(3)) is None
+
+
+def test_quaternion_blend_takes_the_short_path():
+    history = StateHistory(4, 4, quaternion_start=0)
+    qa = quaternion([0, 0, 1], 0.2)
+    qb = quaternion([0, 0, 1], 0.6)
+    history.append(0.0, qa)
+    # Same rotation as qb with the opposite sign, so dot(qa, qb) < 0
+    history.append(1.0, -qb)
+    assert np.dot(qa, -qb) < 0
+
+    out = np.zeros(4)
+    assert history.sample(0.5, out) == 'interpolated'
+    # Halfway between 0.2 and 0.6 rad about z, not the long way round
+    expected = quaternion([0, 0, 1], 0.4)
+    assert abs(np.dot(out, expected)) == pytest.approx(1.0, abs=1e-6)
+    assert np.linalg.norm(out) == pytest.approx(1.0)
+
+
+def test_quaternion_blend_without_sign_flip():
+    history = StateHistory(4, 7, quaternion_start=3)
+    history.append(0.0, np.r_[0, 0, 0, quaternion([1, 0, 0], 0.0)])
+    history.append(1.0, np.r_[2, 0, 0, quaternion([1, 0, 0], 0.5)])
+
+    out = np.zeros(7)
+    assert history.sample(0.5, out) == 'interpolated'
+    np.testing.assert_allclose(out[:3], [1, 0, 0])
+    assert abs(np.dot(out[3:], quaternion([1, 0, 0], 0.25))) == pytest.approx(1.0, abs=1e-6)
+
+
+def test_pose_history_query_and_expiry():
+    poses = PoseHistory(max_markers=2, max_bodies=1, capacity=8, expiry=1.0)
+    body = [(0, np.array([0.0, 0.0, 0.0]), quaternion([0, 1, 0], 0.0))]
+    poses.record(0.0, [5], np.array([[0.0, 0.0, 0.0]]), body)
+    poses.record(0.1, [5], np.array([[1.0, 0.0, 0.0]]), body)
+
+    state = poses.query(0.05)
+    assert [m['id'] for m in state['markers']] == [5]
+    assert state['markers'][0]['status'] == 'interpolated'
+    np.testing.assert_allclose(state['markers'][0]['position'], [0.5, 0, 0])
+    assert state['bodies'][0]['status'] == 'interpolated'
+
+    # Track 5 is not seen for longer than the expiry and its history is recycled
+    poses.record(2.0, [7], np.array([[0.0, 1.0, 0.0]]))
+    assert [m['id'] for m in poses.query(2.0)['markers']] == [7]
+
+
+def test_pose_history_clear_recycles_every_history():
+    poses = PoseHistory(max_markers=2, max_bodies=1, capacity=8)
+    body = [(0, np.zeros(3), quaternion([0, 1, 0], 0.0))]
+    poses.record(0.0, [1, 2], np.zeros((2, 3)), body)
+
+    poses.clear()
+    assert poses.latest_time is None
+    assert poses.query(0.0) == {'markers': [], 'bodies': []}
+
+    # All histories are free again and start empty
+    poses.record(5.0, [3, 4], np.ones((2, 3)), body)
+    state = poses.query(5.05)
+    assert sorted(m['id'] for m in state['markers']) == [3, 4]
+    assert all(m['status'] == 'held' for m in state['markers'])